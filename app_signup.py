@@ -1,16 +1,23 @@
 # app_signup.py
 from datetime import datetime
+from functools import wraps
 import sqlite3
 import time
 
-from flask import Flask, request, jsonify, Response, render_template
+from flask import Flask, request, jsonify, Response, render_template, send_file
 from flask_cors import CORS
 
 # Camera helpers
 from camera import (
-    start_capture, stop_capture, detect_crop, mjpeg_generator,
-    get_latest_result, mark_sorting_start
+    start_capture, stop_capture, mjpeg_generator,
+    get_latest_result, add_lane, get_lane, list_lanes, DEFAULT_LANE,
+    gate_config
 )
+from model_inference import registry as model_registry, tta_status, predict_health, artifact_path
+from snapshot_archive import archive as snapshot_store
+from auth import sessions, profiles, hash_password, verify_password, reject_unknown_user
+from retention import RetentionScheduler, iter_export, EXPORT_LEVELS, RETAINED_TABLES
+from duotectdb_init import init_db
 
 # --------------------------------------------------
 # Flask app
@@ -23,11 +30,15 @@ app = Flask(
 )
 CORS(app)
 
+DB_PATH = 'duotectdb.sqlite3'
+MODEL_ERROR_WINDOW_S = 60.0   # /system-status: inference errors/timeouts this recent = degraded
+ADMIN_ROLE = 'admin'          # tbl_users.role allowed on /admin/*; set in the DB, /signup refuses it
+
 # --------------------------------------------------
 # DB helpers
 # --------------------------------------------------
 def insert_user(data):
-    conn = sqlite3.connect('duotectdb.sqlite3')
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     try:
         c.execute('''
@@ -43,16 +54,84 @@ def insert_user(data):
             data.get('street', ''),
             data.get('city', ''),
             data.get('zip_code', ''),
-            data.get('password', ''),
+            hash_password(data.get('password', '')),
             data.get('role', '')
         ))
         conn.commit()
+        profiles.invalidate(data.get('mobile_number', ''))
         return True, "User registered successfully."
     except sqlite3.IntegrityError:
         return False, "Mobile number already exists."
     finally:
         conn.close()
 
+def load_profile(mobile):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('''SELECT first_name, middle_name, last_name, mobile_number,
+                        baranggay, street, city, zip_code, role
+                 FROM tbl_users WHERE mobile_number=?''', (mobile,))
+    user = c.fetchone()
+    conn.close()
+    if not user:
+        return None
+    return {
+        'first_name': user[0],
+        'middle_name': user[1],
+        'last_name': user[2],
+        'mobile_number': user[3],
+        'baranggay': user[4],
+        'street': user[5],
+        'city': user[6],
+        'zip_code': user[7],
+        'role': user[8]
+    }
+
+def _session_token():
+    """Token from 'Authorization: Bearer ...' or a JSON 'token' field."""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip()
+    return (request.get_json(silent=True) or {}).get('token')
+
+def _is_admin_role(role):
+    return (role or '').strip().lower() == ADMIN_ROLE
+
+def _require_admin(view):
+    """401 without a live session token (see /login), 403 unless its user has ADMIN_ROLE."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        mobile = sessions.resolve(_session_token())
+        if not mobile:
+            return jsonify({'success': False, 'message': 'Login required.'}), 401
+        user = load_profile(mobile)  # not the profile cache: a role change in the DB applies at once
+        if not user or not _is_admin_role(user.get('role')):
+            return jsonify({'success': False, 'message': 'Admin role required.'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def _lane_arg():
+    """Lane name from ?lane=... or a JSON 'lane' field; None means the default lane."""
+    lane = request.args.get('lane')
+    if lane is None and request.is_json:
+        lane = (request.get_json(silent=True) or {}).get('lane')
+    return str(lane) if lane not in (None, '') else None
+
+def _unknown_lane(lane):
+    return jsonify({'success': False, 'message': f'Unknown lane: {lane}'}), 404
+
+def _time_detected(value):
+    """Client timestamp as local '%Y-%m-%d %H:%M:%S' (now if missing); None if unparseable."""
+    if not value:
+        return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
 # --------------------------------------------------
 # API: Auth & Profile
 # --------------------------------------------------
@@ -62,6 +141,8 @@ def signup():
     required = ['first_name', 'last_name', 'mobile_number', 'password', 'role', 'baranggay']
     if not all(data.get(k) for k in required):
         return jsonify({'success': False, 'message': 'Missing required fields.'}), 400
+    if _is_admin_role(data.get('role')):
+        return jsonify({'success': False, 'message': 'Admin accounts cannot be created by sign-up.'}), 403
     ok, msg = insert_user(data)
     return jsonify({'success': ok, 'message': msg})
 
@@ -73,47 +154,40 @@ def login():
     if not mobile or not password:
         return jsonify({'success': False, 'message': 'Missing mobile number or password.'}), 400
 
-    conn = sqlite3.connect('duotectdb.sqlite3')
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute('SELECT * FROM tbl_users WHERE mobile_number=? AND password=?', (mobile, password))
-    user = c.fetchone()
+    c.execute('SELECT password FROM tbl_users WHERE mobile_number=?', (mobile,))
+    row = c.fetchone()
+    ok, needs_rehash = verify_password(password, row[0]) if row else reject_unknown_user(password)
+    if ok and needs_rehash:
+        # Plaintext (pre-hashing) or old-cost hash: upgrade it now that we know the password
+        c.execute('UPDATE tbl_users SET password=? WHERE mobile_number=?', (hash_password(password), mobile))
+        conn.commit()
     conn.close()
 
-    if user:
-        return jsonify({'success': True, 'message': 'Login successful.'})
+    if ok:
+        return jsonify({'success': True, 'message': 'Login successful.', 'token': sessions.issue(mobile)})
     else:
         return jsonify({'success': False, 'message': 'Invalid mobile number or password.'}), 401
 
+@app.route('/logout', methods=['POST'])
+def logout():
+    sessions.revoke(_session_token())
+    return jsonify({'success': True, 'message': 'Logged out.'})
+
 @app.route('/profile', methods=['POST'])
 def profile():
-    data = request.json or {}
-    mobile = data.get('mobile_number')
+    """Profile of the session's user (token from /login; a bare mobile_number is not accepted)."""
+    token = _session_token()
+    if not token:
+        return jsonify({'success': False, 'message': 'Login required.'}), 401
+    mobile = sessions.resolve(token)
     if not mobile:
-        return jsonify({'success': False, 'message': 'Missing mobile number.'}), 400
-
-    conn = sqlite3.connect('duotectdb.sqlite3')
-    c = conn.cursor()
-    c.execute('''SELECT first_name, middle_name, last_name, mobile_number,
-                        baranggay, street, city, zip_code, role
-                 FROM tbl_users WHERE mobile_number=?''', (mobile,))
-    user = c.fetchone()
-    conn.close()
+        return jsonify({'success': False, 'message': 'Session expired.'}), 401
 
+    user = profiles.get(mobile, load_profile)
     if user:
-        return jsonify({
-            'success': True,
-            'profile': {
-                'first_name': user[0],
-                'middle_name': user[1],
-                'last_name': user[2],
-                'mobile_number': user[3],
-                'baranggay': user[4],
-                'street': user[5],
-                'city': user[6],
-                'zip_code': user[7],
-                'role': user[8]
-            }
-        })
+        return jsonify({'success': True, 'profile': user})
     else:
         return jsonify({'success': False, 'message': 'User not found.'}), 404
 
@@ -128,7 +202,10 @@ def save_sorting():
     # Only save if crop_type and color are present and valid
     if not crop_type or crop_type.lower() == 'unknown' or not color:
         return jsonify({'success': False, 'message': 'Invalid detection. Not saved.'}), 400
-    conn = sqlite3.connect('duotectdb.sqlite3')
+    time_detected = _time_detected(data.get('time_detected'))
+    if time_detected is None:
+        return jsonify({'success': False, 'message': 'time_detected must be YYYY-MM-DD HH:MM:SS.'}), 400
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute('''
         INSERT INTO tbl_sorting (crop_type, condition, color, sorted_to, size, time_detected)
@@ -139,7 +216,7 @@ def save_sorting():
         color,
         data.get('sorted_to', ''),
         data.get('size', ''),
-        data.get('time_detected', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        time_detected
     ))
     conn.commit()
     conn.close()
@@ -147,7 +224,7 @@ def save_sorting():
 
 @app.route('/get_latest_sorting', methods=['GET'])
 def get_latest_sorting():
-    conn = sqlite3.connect('duotectdb.sqlite3')
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute('''
         SELECT crop_type, condition, color, sorted_to, size, time_detected
@@ -171,12 +248,37 @@ def get_latest_sorting():
 
 @app.route('/system-status', methods=['GET'])
 def system_status():
+    """
+    Per-lane capture/inference/preview health plus the model. 'degraded'
+    (HTTP 503) when a running lane has stalled or inference is failing.
+    """
     try:
+        lanes = [lane.health() for lane in list_lanes()]
+        model = {**model_registry.status(), **predict_health}
+        unhealthy = [h['lane'] for h in lanes if h['running'] and not h['healthy']]
+        # A prediction that never returns is reported once as an error; stay
+        # degraded for as long as it is still outstanding, not just after the error
+        slow = [h['lane'] for h in lanes
+                if h['running'] and (h['inference_overdue_s'] is not None
+                                     or (h['stages']['inference']['error_age_s'] is not None
+                                         and h['stages']['inference']['error_age_s'] < MODEL_ERROR_WINDOW_S))]
+        model_failing = (predict_health['last_error_at'] is not None
+                         and time.time() - predict_health['last_error_at'] < MODEL_ERROR_WINDOW_S)
+
+        problems = []
+        if unhealthy:
+            problems.append(f"lane(s) {', '.join(unhealthy)} not capturing")
+        if slow:
+            problems.append(f"inference failing or timing out on lane(s) {', '.join(slow)}")
+        if model_failing:
+            problems.append(f"inference errors: {predict_health['last_error']}")
         return jsonify({
-            'status': 'online',
+            'status': 'degraded' if problems else 'online',
             'timestamp': datetime.now().isoformat(),
-            'message': 'System is running normally'
-        }), 200
+            'message': '; '.join(problems) if problems else 'System is running normally',
+            'lanes': lanes,
+            'model': model
+        }), 503 if problems else 200
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -186,7 +288,10 @@ def get_result():
     Return the latest classification result. If not present, return success=False.
     (Suppressed during 'armed' window inside camera.get_latest_result.)
     """
-    result = get_latest_result()
+    lane = _lane_arg()
+    if get_lane(lane) is None:
+        return _unknown_lane(lane)
+    result = get_latest_result(lane)
     if result and result.get("present"):
         out = {
             'crop_type':     result.get('crop_type', ''),
@@ -203,57 +308,45 @@ def get_result():
     else:
         return jsonify({'success': False, 'message': 'No result yet'}), 200
 
-last_saved_seq = None  # You can use a global variable or query the DB for the last seq
-
-@app.route('/start_sorting', methods=['POST'])
-def start_sorting():
-    """
-    Arm detection and wait (short timeout) for a *new* detection that occurs
-    after this call. Save it to DB and return it. If no crop appears, return success=False.
-    """
-    _ = (request.get_json(silent=True) or {}).get('crop_type')
-
-    # 1) Arm: clear any cached detection and record the current seq token
-    start_token = mark_sorting_start()
+START_SORTING_TIMEOUT_S = 12.0
+START_SORTING_POLL_S    = 0.20
 
-    # 2) Wait for a brand-new detection (seq > start_token)
-    timeout = 12.0
-    poll_interval = 0.20
-    end_time = time.time() + timeout
-
-    # Query DB for last saved seq
-    conn = sqlite3.connect('duotectdb.sqlite3')
+def last_saved_seq(lane_name):
+    """Last seq saved to tbl_sorting for a lane (seq spaces are per lane)."""
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    c.execute('SELECT seq FROM tbl_sorting ORDER BY time_detected DESC LIMIT 1')
+    # Newest first on the integer ts index; stops at the first row for this lane
+    c.execute('''SELECT d.seq FROM tbl_detection d LEFT JOIN tbl_dim l ON l.id = d.lane_id
+                 WHERE COALESCE(l.value, ?) = ?
+                 ORDER BY d.ts DESC, d.id DESC LIMIT 1''', (DEFAULT_LANE, lane_name))
     row = c.fetchone()
-    last_saved_seq = row[0] if row else None
     conn.close()
+    return row[0] if row else None
 
-    detected = None
-    while time.time() < end_time:
-        res = detect_crop()
-        seq_val = res.get("seq", 0) if res else 0
-        # Only accept if seq is new and greater than both start_token and last_saved_seq
-        if res and seq_val > start_token and (last_saved_seq is None or seq_val > last_saved_seq):
-            detected = res
-            last_saved_seq = seq_val
-            break
-        time.sleep(poll_interval)
-
-    if not detected:
-        return jsonify({'success': False, 'message': 'No crop detected'}), 200
+def max_saved_seq(lane_name):
+    """Highest seq a previous run stored for a lane (detections or snapshots)."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    c.execute('''SELECT MAX(d.seq) FROM tbl_detection d LEFT JOIN tbl_dim l ON l.id = d.lane_id
+                 WHERE COALESCE(l.value, ?) = ?''', (DEFAULT_LANE, lane_name))
+    row = c.fetchone()
+    conn.close()
+    return max(row[0] or 0, snapshot_store.max_seq(lane_name))
 
-    # 3) Save to DB only if crop is present
-    conn = sqlite3.connect('duotectdb.sqlite3')
+def save_detection(detected, lane_name):
+    """Insert a detection into tbl_sorting unless its (seq, lane) is already saved."""
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
 
     # Before saving to DB, check if seq is already present
-    c.execute('SELECT COUNT(*) FROM tbl_sorting WHERE seq=?', (detected.get('seq', 0),))
+    c.execute('''SELECT COUNT(*) FROM tbl_detection d LEFT JOIN tbl_dim l ON l.id = d.lane_id
+                 WHERE d.seq=? AND COALESCE(l.value, ?) = ?''',
+              (detected.get('seq', 0), DEFAULT_LANE, lane_name))
     if c.fetchone()[0] == 0:
         # Save only if seq is not already in DB
         c.execute('''
-            INSERT INTO tbl_sorting (crop_type, condition, color, sorted_to, size, time_detected, seq)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO tbl_sorting (crop_type, condition, color, sorted_to, size, time_detected, seq, lane)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             detected.get('crop_type', ''),
             detected.get('condition', ''),
@@ -261,21 +354,52 @@ def start_sorting():
             detected.get('sorted_to', ''),
             detected.get('size', ''),
             detected.get('time_detected', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-            detected.get('seq', 0)
+            detected.get('seq', 0),
+            lane_name
         ))
         conn.commit()
     conn.close()
 
-    return jsonify({'success': True, 'result': detected}), 200
+def arm_sorting(cam):
+    """
+    /start_sorting step 1: clear the lane's cached detection and return the
+    seq a new detection must exceed (past the arm token and the last saved row).
+    """
+    start_token = cam.mark_sorting_start()
+    return max(start_token, last_saved_seq(cam.name) or 0)
+
+def finish_sorting(cam, detected):
+    """/start_sorting step 3: save the detection (if any) and build the response body."""
+    if not detected:
+        return {'success': False, 'message': 'No crop detected'}
+    save_detection(detected, cam.name)
+    return {'success': True, 'result': detected}
+
+@app.route('/start_sorting', methods=['POST'])
+def start_sorting():
+    """
+    Arm detection and wait (short timeout) for a *new* detection that occurs
+    after this call. Save it to DB and return it. If no crop appears, return success=False.
+    (asgi.py serves this route as a coroutine with the same steps.)
+    """
+    _ = (request.get_json(silent=True) or {}).get('crop_type')
+    lane = _lane_arg()
+    cam = get_lane(lane)
+    if cam is None:
+        return _unknown_lane(lane)
+
+    after_seq = arm_sorting(cam)
+    detected = cam.wait_for_detection_blocking(after_seq, START_SORTING_TIMEOUT_S, START_SORTING_POLL_S)
+    return jsonify(finish_sorting(cam, detected)), 200
 
 @app.route('/get_activity_log', methods=['GET'])
 def get_activity_log():
-    conn = sqlite3.connect('duotectdb.sqlite3')
+    conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
     c.execute('''
         SELECT time_detected, crop_type, color, condition, sorted_to, size
         FROM tbl_sorting
-        ORDER BY time_detected DESC
+        ORDER BY ts DESC
     ''')
     rows = c.fetchall()
     conn.close()
@@ -292,6 +416,87 @@ def get_activity_log():
     ]
     return jsonify({'success': True, 'activity_log': result})
 
+@app.route('/export_sorting', methods=['GET'])
+def export_sorting():
+    """
+    Stream rows as CSV without loading them into memory.
+    ?level=detail|hourly|daily  ?since=/until= (time_detected or bucket bounds)  ?table=tbl_sorting|tbl_actlog
+    """
+    level = request.args.get('level', 'detail')
+    table = request.args.get('table', 'tbl_sorting')
+    if level not in EXPORT_LEVELS or table not in RETAINED_TABLES:
+        return jsonify({'success': False, 'message': 'Invalid level or table.'}), 400
+    rows = iter_export(DB_PATH, level, request.args.get('since'), request.args.get('until'), table)
+    filename = f"{table}_{level}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return Response(
+        rows,
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+# --------------------------------------------------
+# API: Admin (hot reload)
+# --------------------------------------------------
+@app.route('/admin/config', methods=['GET'])
+@_require_admin
+def admin_config():
+    return jsonify({
+        'success': True,
+        'gate': gate_config.current,
+        'gate_error': gate_config.last_error,
+        'model': model_registry.status(),
+        'tta': tta_status()
+    })
+
+@app.route('/admin/gate_config', methods=['POST'])
+@_require_admin
+def admin_gate_config():
+    """JSON body of threshold overrides, or {"reload": true} to re-read the config file."""
+    data = request.get_json(silent=True) or {}
+    data.pop('token', None)
+    if data.pop('reload', False):
+        gate_config.reload()
+        if gate_config.last_error:
+            return jsonify({'success': False, 'message': gate_config.last_error}), 400
+    try:
+        gate = gate_config.update(data)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'gate': gate})
+
+@app.route('/admin/reload_model', methods=['POST'])
+@_require_admin
+def admin_reload_model():
+    """
+    Load + warm a new model in the background; the live one keeps serving until swap.
+    Optional model_path/classes_path/preproc_path must name files inside artifacts/.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        paths = {k: artifact_path(data[k]) if data.get(k) else None
+                 for k in ('model_path', 'classes_path', 'preproc_path')}
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    started = model_registry.reload(**paths)
+    if not started:
+        return jsonify({'success': False, 'message': 'Reload already in progress.'}), 409
+    return jsonify({'success': True, 'message': 'Reload started.'}), 202
+
+@app.route('/admin/record', methods=['POST'])
+@_require_admin
+def admin_record():
+    """Start/stop the record-and-replay log for a lane: {"lane": "0", "enabled": true}."""
+    data = request.get_json(silent=True) or {}
+    cam = get_lane(_lane_arg())
+    if cam is None:
+        return _unknown_lane(_lane_arg())
+    if data.get('enabled', True):
+        recording = cam.start_recording().stats()
+    else:
+        cam.stop_recording()
+        recording = None
+    return jsonify({'success': True, 'lane': cam.name, 'recording': recording})
+
 # --------------------------------------------------
 # Web pages
 # --------------------------------------------------
@@ -321,24 +526,60 @@ def history():
 # Camera stream
 # --------------------------------------------------
 @app.route('/video_feed')
-def video_feed():
+@app.route('/video_feed/<lane>')
+def video_feed(lane=None):
+    lane = lane or _lane_arg()
+    if get_lane(lane) is None:
+        return _unknown_lane(lane)
     return Response(
-        mjpeg_generator(),
-        mimetype="multipart/x-mixed-replace; boundary=frame"
+        mjpeg_generator(lane, request.args.get('tier')),
+        mimetype="multipart/x-mixed-replace; boundary=frame",
+        headers={'X-Stream-Healthy': '1' if get_lane(lane).healthy else '0'}
     )
 
+@app.route('/snapshot/<lane>/<int:seq>', methods=['GET'])
+def snapshot(lane, seq):
+    """Archived frame behind a saved detection (see snapshot_archive)."""
+    path = snapshot_store.path_for(lane, seq)
+    if path is None:
+        return jsonify({'success': False, 'message': 'No snapshot for this detection.'}), 404
+    return send_file(str(path), max_age=86400)
+
+@app.route('/lanes', methods=['GET'])
+def lanes():
+    return jsonify({
+        'success': True,
+        'lanes': [
+            {
+                'lane': l.name,
+                'index': l.index,
+                'running': l.running,
+                'frames_captured': l.frames_captured,
+                'inference_count': l.inference_count,
+                'accepted_count': l.accepted_count,
+                'skipped_count': l.skipped_count,
+                'foreground_score': round(l.foreground_score, 4),
+                'recording': l.recorder.stats() if l.recorder else None
+            }
+            for l in list_lanes()
+        ]
+    })
+
 @app.route('/stop_sorting', methods=['POST'])
 def stop_sorting():
-    stop_capture()
+    stop_capture(_lane_arg())
     return jsonify({'success': True, 'message': 'Sorting stopped.'})
 
 @app.route('/get_latest_detection', methods=['GET'])
 def get_latest_detection():
-    result = get_latest_result()
-    # Suppress result if seq <= _armed_token (cached or old)
-    from camera import _armed_token
+    lane = _lane_arg()
+    if get_lane(lane) is None:
+        return _unknown_lane(lane)
+    result = get_latest_result(lane)
+    # Suppress result if seq <= the lane's armed token (cached or old)
+    armed_token = get_lane(lane).armed_token
     seq_val = result.get("seq", 0) if result else 0
-    if result and result.get("present") and seq_val > _armed_token:
+    if result and result.get("present") and seq_val > armed_token:
         return jsonify({'success': True, 'result': result}), 200
     else:
         return jsonify({'success': False, 'message': 'No crop detected'}), 200
@@ -346,6 +587,23 @@ def get_latest_detection():
 # --------------------------------------------------
 # Main
 # --------------------------------------------------
+# Camera lanes to start at boot: "name=index" pairs, e.g. "0=0,1=1".
+CAMERA_LANES = "0=0"
+
+def start_lanes(spec=CAMERA_LANES):
+    for item in filter(None, (p.strip() for p in spec.split(','))):
+        name, _, index = item.partition('=')
+        index = index or name
+        index = int(index) if index.isdigit() else index
+        # seq restarts would otherwise collide with rows and snapshots saved by earlier runs
+        add_lane(name, index).resume_seq(max_saved_seq(name))
+        start_capture(index, lane=name)
+
+# Development server only; production runs through asgi.py (uvicorn).
 if __name__ == '__main__':
-    start_capture()  # start camera thread for streaming + background inference
+    init_db(DB_PATH)  # create/upgrade the schema (older tbl_sorting tables are migrated)
+    start_lanes()  # start camera threads for streaming + background inference
+    model_registry.start_watching()  # hot-reload model artifacts on change
+    gate_config.start_watching()     # hot-reload artifacts/gate.json on change
+    RetentionScheduler(DB_PATH).start()  # compaction + ANALYZE/VACUUM off the request path
     app.run(host="0.0.0.0", port=8000, threaded=True, debug=True, use_reloader=False)
@@ -0,0 +1,214 @@
+# asgi.py
+#
+# Production entry point: an ASGI app that serves the long-lived routes
+# (/video_feed, /start_sorting) as coroutines and hands every other route to
+# the Flask app on a bounded thread pool.
+#
+#   python asgi.py --port 8000 --limit-concurrency 200 --keep-alive 5
+#   uvicorn asgi:app --host 0.0.0.0 --port 8000      (same app, external runner)
+#
+# One server process: the cameras, their preview frames and the armed
+# /start_sorting state live in this process, so it must serve every request.
+# Concurrency comes from async streaming plus the WSGI thread pool.
+#
+# Needs: uvicorn, a2wsgi (plus the Flask app's own dependencies).
+import argparse
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+import app_signup
+from app_signup import app as flask_app, start_lanes, arm_sorting, finish_sorting
+from app_signup import CAMERA_LANES, START_SORTING_TIMEOUT_S, START_SORTING_POLL_S
+from retention import RetentionScheduler
+from duotectdb_init import init_db
+from camera import get_lane, gate_config
+from model_inference import registry as model_registry
+
+# --------------------------------------------------
+# Config (env so that an external uvicorn runner sees the same values)
+# --------------------------------------------------
+WSGI_THREADS = int(os.environ.get("DUOTECTIQ_WSGI_THREADS", "8"))   # threads for plain Flask routes
+CAPTURE      = os.environ.get("DUOTECTIQ_CAPTURE", "1") == "1"      # start camera lanes in this process
+LANES        = os.environ.get("DUOTECTIQ_LANES", CAMERA_LANES)
+
+_wsgi = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+
+
+# --------------------------------------------------
+# Small ASGI helpers
+# --------------------------------------------------
+async def _read_body(receive) -> bytes:
+    body = b""
+    more = True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    return body
+
+
+async def _send_json(send, status, payload):
+    data = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(data)).encode()),
+            (b"access-control-allow-origin", b"*"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+def _query_arg(scope, name):
+    qs = parse_qs(scope.get("query_string", b"").decode())
+    return qs.get(name, [None])[0] or None
+
+
+def _query_lane(scope):
+    return _query_arg(scope, "lane")
+
+
+# --------------------------------------------------
+# Async routes
+# --------------------------------------------------
+async def video_feed(scope, receive, send, lane):
+    cam = get_lane(lane)
+    if cam is None:
+        await _send_json(send, 404, {"success": False, "message": f"Unknown lane: {lane}"})
+        return
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"multipart/x-mixed-replace; boundary=frame"),
+            # Stale streams keep going with a placeholder frame (see CameraLane._next_part)
+            (b"x-stream-healthy", b"1" if cam.healthy else b"0"),
+        ],
+    })
+
+    # Stop streaming as soon as the client goes away.
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                return
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        async for chunk in cam.mjpeg_agenerator(_query_arg(scope, "tier")):
+            if disconnected.is_set():
+                break
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    except OSError:
+        pass
+    finally:
+        watcher.cancel()
+
+
+async def start_sorting(scope, receive, send):
+    """Coroutine version of app_signup.start_sorting (same contract)."""
+    try:
+        data = json.loads(await _read_body(receive) or b"{}")
+    except ValueError:
+        data = {}
+    lane = _query_lane(scope) or (str(data["lane"]) if data.get("lane") not in (None, "") else None)
+    cam = get_lane(lane)
+    if cam is None:
+        await _send_json(send, 404, {"success": False, "message": f"Unknown lane: {lane}"})
+        return
+
+    after_seq = await asyncio.to_thread(arm_sorting, cam)
+    detected = await cam.wait_for_detection(after_seq, START_SORTING_TIMEOUT_S, START_SORTING_POLL_S)
+    await _send_json(send, 200, await asyncio.to_thread(finish_sorting, cam, detected))
+
+
+# --------------------------------------------------
+# ASGI app
+# --------------------------------------------------
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await asyncio.to_thread(init_db, app_signup.DB_PATH)
+            if CAPTURE:
+                start_lanes(LANES)
+            model_registry.start_watching()
+            gate_config.start_watching()
+            RetentionScheduler(app_signup.DB_PATH).start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if CAPTURE:
+                app_signup.stop_capture()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+
+    if scope["type"] == "http":
+        path = scope["path"].rstrip("/") or "/"
+        method = scope["method"]
+        if path == "/video_feed":
+            await video_feed(scope, receive, send, _query_lane(scope))
+            return
+        if path.startswith("/video_feed/"):
+            await video_feed(scope, receive, send, path[len("/video_feed/"):])
+            return
+        if path == "/start_sorting" and method == "POST":
+            await start_sorting(scope, receive, send)
+            return
+
+    await _wsgi(scope, receive, send)
+
+
+# --------------------------------------------------
+# Runner
+# --------------------------------------------------
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run DUOTECTIQ behind uvicorn (ASGI).")
+    parser.add_argument("--host", default=os.environ.get("DUOTECTIQ_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("DUOTECTIQ_PORT", "8000")))
+    parser.add_argument("--wsgi-threads", type=int, default=WSGI_THREADS,
+                        help="threads serving plain Flask routes per process")
+    parser.add_argument("--limit-concurrency", type=int,
+                        default=int(os.environ.get("DUOTECTIQ_LIMIT_CONCURRENCY", "200")),
+                        help="max open connections/tasks before answering 503")
+    parser.add_argument("--keep-alive", type=int, default=int(os.environ.get("DUOTECTIQ_KEEP_ALIVE", "5")),
+                        help="idle keep-alive timeout in seconds")
+    parser.add_argument("--lanes", default=LANES, help='camera lanes, e.g. "0=0,1=1"')
+    parser.add_argument("--no-capture", action="store_true",
+                        help="API/DB only: do not open cameras (camera routes get no frames)")
+    args = parser.parse_args(argv)
+
+    # uvicorn re-imports this module from the "asgi:app" string, so pass settings through env.
+    os.environ["DUOTECTIQ_WSGI_THREADS"] = str(args.wsgi_threads)
+    os.environ["DUOTECTIQ_CAPTURE"] = "0" if args.no_capture else "1"
+    os.environ["DUOTECTIQ_LANES"] = args.lanes
+
+    uvicorn.run(
+        "asgi:app",
+        host=args.host,
+        port=args.port,
+        limit_concurrency=args.limit_concurrency,
+        timeout_keep_alive=args.keep_alive,
+        lifespan="on",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# auth.py
+#
+# Password hashing, login sessions and an in-memory profile cache for
+# app_signup. Page loads resolve the user from a session token and the cache
+# instead of opening SQLite every time.
+import hashlib
+import hmac
+import secrets
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+AUTH_DB_PATH        = "duotectdb.sqlite3"
+HASH_ALGORITHM      = "pbkdf2_sha256"
+HASH_ITERATIONS     = 60_000     # roughly 50-100 ms per login on a Pi 4; raise on faster hosts
+SALT_BYTES          = 16
+SESSION_TTL_S       = 12 * 3600
+SESSION_MEMORY_MAX  = 1024       # resolved sessions kept in memory
+PROFILE_CACHE_SIZE  = 256
+
+
+# ---------------------------
+# Password hashing
+# ---------------------------
+def hash_password(password: str, iterations: int = HASH_ITERATIONS) -> str:
+    """'pbkdf2_sha256$<iterations>$<salt hex>$<digest hex>'."""
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password: str, stored: str) -> tuple[bool, bool]:
+    """
+    Returns (matches, needs_rehash). Rows saved before hashing hold the
+    plaintext password; those still verify and are flagged for rehash, as are
+    hashes made with a different iteration count.
+    """
+    if not stored:
+        return False, False
+    parts = stored.split("$")
+    if len(parts) != 4 or parts[0] != HASH_ALGORITHM:
+        verify_password(password, _DUMMY_HASH)  # same cost as a hashed row
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    _, iterations, salt, digest = parts
+    check = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations))
+    ok = hmac.compare_digest(check.hex(), digest)
+    return ok, ok and int(iterations) != HASH_ITERATIONS
+
+
+def reject_unknown_user(password: str) -> tuple[bool, bool]:
+    """Login for a number with no account: spend a real verify so timing does not reveal it."""
+    verify_password(password, _DUMMY_HASH)
+    return False, False
+
+
+_DUMMY_HASH = hash_password(secrets.token_hex(16))
+
+
+# ---------------------------
+# Sessions
+# ---------------------------
+class SessionStore:
+    """
+    Opaque bearer tokens issued at login. Only the token's sha256 is stored
+    (tbl_sessions), so sessions survive restarts and are shared by every
+    server process; resolved tokens are kept in memory until they expire.
+    """
+
+    def __init__(self, db_path=AUTH_DB_PATH, ttl=SESSION_TTL_S):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._memory = OrderedDict()  # token hash -> (mobile_number, expires_at)
+        self._lock = Lock()
+
+    def issue(self, mobile_number: str) -> str:
+        token = secrets.token_urlsafe(32)
+        key = _token_key(token)
+        expires = time.time() + self.ttl
+        conn = sqlite3.connect(self.db_path)
+        try:
+            _create_table(conn)
+            conn.execute('DELETE FROM tbl_sessions WHERE expires_at < ?', (time.time(),))
+            conn.execute('INSERT INTO tbl_sessions (token_hash, mobile_number, expires_at) VALUES (?, ?, ?)',
+                         (key, mobile_number, expires))
+            conn.commit()
+        finally:
+            conn.close()
+        self._remember(key, mobile_number, expires)
+        return token
+
+    def resolve(self, token: str | None) -> str | None:
+        """Mobile number the token was issued to, or None if unknown/expired."""
+        if not token:
+            return None
+        key = _token_key(token)
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit:
+                self._memory.move_to_end(key)
+        if hit is None:
+            conn = sqlite3.connect(self.db_path)
+            try:
+                hit = conn.execute('SELECT mobile_number, expires_at FROM tbl_sessions WHERE token_hash=?',
+                                   (key,)).fetchone()
+            except sqlite3.OperationalError:
+                hit = None  # nobody has logged in yet, table not created
+            finally:
+                conn.close()
+            if hit is None:
+                return None
+            self._remember(key, *hit)
+        mobile_number, expires = hit
+        if expires < time.time():
+            self.revoke(token)
+            return None
+        return mobile_number
+
+    def revoke(self, token: str | None):
+        if not token:
+            return
+        key = _token_key(token)
+        with self._lock:
+            self._memory.pop(key, None)
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('DELETE FROM tbl_sessions WHERE token_hash=?', (key,))
+            conn.commit()
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.close()
+
+    def _remember(self, key, mobile_number, expires):
+        with self._lock:
+            self._memory[key] = (mobile_number, expires)
+            self._memory.move_to_end(key)
+            while len(self._memory) > SESSION_MEMORY_MAX:
+                self._memory.popitem(last=False)
+
+
+# ---------------------------
+# Profile cache
+# ---------------------------
+class ProfileCache:
+    """LRU of mobile_number -> profile dict. Misses are not cached."""
+
+    def __init__(self, maxsize=PROFILE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, mobile_number, loader):
+        """Cached profile, or loader(mobile_number) on a miss (stored if not None)."""
+        with self._lock:
+            profile = self._items.get(mobile_number)
+            if profile is not None:
+                self._items.move_to_end(mobile_number)
+                self.hits += 1
+                return dict(profile)
+            self.misses += 1
+        profile = loader(mobile_number)
+        if profile is not None:
+            with self._lock:
+                self._items[mobile_number] = dict(profile)
+                while len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+        return profile
+
+    def invalidate(self, mobile_number=None):
+        """Drop one user's profile (after signup/profile changes), or all of them."""
+        with self._lock:
+            if mobile_number is None:
+                self._items.clear()
+            else:
+                self._items.pop(mobile_number, None)
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _create_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tbl_sessions (
+            token_hash TEXT PRIMARY KEY,
+            mobile_number TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+
+sessions = SessionStore()
+profiles = ProfileCache()
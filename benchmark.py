@@ -0,0 +1,232 @@
+# benchmark.py
+#
+# Microbenchmarks for the inference and gating hot paths.
+#
+#   python benchmark.py run --out bench_new.json                 (synthetic frames)
+#   python benchmark.py run --frames recorded/ --out bench.json  (plus recorded frames)
+#   python benchmark.py compare bench_old.json bench_new.json    (exit 1 on regression)
+import argparse
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+RESOLUTIONS      = [(320, 240), (640, 480), (1280, 720)]
+BATCH_SIZES      = [1, 2, 4, 8]
+WARMUP           = 5
+REPEAT           = 50
+REGRESSION_PCT   = 10.0   # compare: median slower by more than this is a regression
+
+
+# --------------------------------------------------
+# Timing
+# --------------------------------------------------
+def measure(fn, warmup=WARMUP, repeat=REPEAT):
+    """Call fn() warmup times untimed, then repeat times; return a stats dict (ms)."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    q1, q3 = np.percentile(samples, [25, 75])
+    return {
+        "n": repeat,
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(samples),
+        "stdev_ms": statistics.stdev(samples) if repeat > 1 else 0.0,
+        "min_ms": samples[0],
+        "p95_ms": float(np.percentile(samples, 95)),
+        "iqr_ms": float(q3 - q1),
+    }
+
+
+# --------------------------------------------------
+# Inputs
+# --------------------------------------------------
+def synthetic_frame(width, height, seed=0):
+    """Textured background with a coloured blob, like a crop on the belt."""
+    import cv2
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(60, 110, size=(height, width, 3), dtype=np.uint8)
+    cv2.ellipse(frame, (width // 2, height // 2), (width // 8, height // 8), 0, 0, 360, (40, 40, 200), -1)
+    return frame
+
+
+def recorded_frames(folder, limit=20):
+    import cv2
+    exts = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+    out = []
+    for path in sorted(Path(folder).rglob("*")):
+        if path.suffix.lower() in exts:
+            img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+            if img is not None:
+                out.append(img)
+        if len(out) >= limit:
+            break
+    return out
+
+
+# --------------------------------------------------
+# Benchmarks
+# --------------------------------------------------
+def bench_model(frames_by_name, batch_sizes, warmup, repeat):
+    import model_inference as mi
+
+    model = mi.registry.current
+    results = {}
+    n_classes = len(model.class_names)
+
+    for name, frame in frames_by_name.items():
+        results[f"preprocess[{name}]"] = measure(lambda: mi.preprocess(frame, model), warmup, repeat)
+        results[f"preprocess_views[{name}]"] = measure(
+            lambda: mi.preprocess_views(frame, model, mi.TTA_VIEWS), warmup, repeat)
+
+    ref = next(iter(frames_by_name.values()))
+    single = mi.preprocess(ref, model)
+    for bs in batch_sizes:
+        batch = np.repeat(single, bs, axis=0)
+        results[f"session.run[batch={bs}]"] = measure(lambda: mi._run_logits(batch, model), warmup, repeat)
+        logits = mi._run_logits(batch, model)
+        results[f"_softmax[batch={bs}]"] = measure(lambda: mi._softmax(logits), warmup, repeat)
+        frames = [ref] * bs
+        results[f"predict_probs[tta, batch={bs}]"] = measure(
+            lambda: mi.predict_probs(frames, model, mi.TTA_VIEWS), warmup, repeat)
+
+    probs = mi._softmax(np.random.default_rng(0).normal(size=(1, n_classes)))[0]
+    results["class_parse"] = measure(lambda: mi.class_fields(int(np.argmax(probs)), model), warmup, repeat)
+    return results
+
+
+def bench_gating(frames_by_name, warmup, repeat):
+    import camera
+
+    results = {}
+    cfg = camera.gate_config.current
+    for name, frame in frames_by_name.items():
+        results[f"_scene_stats[{name}]"] = measure(lambda: camera._scene_stats(frame), warmup, repeat)
+
+        lane = camera.CameraLane(f"bench-{name}")
+        shifted = np.roll(frame, 8, axis=1)
+        toggle = [frame, shifted]
+        i = [0]
+
+        def background():
+            i[0] ^= 1
+            lane._update_background(toggle[i[0]], cfg)
+        results[f"_update_background[{name}]"] = measure(background, warmup, repeat)
+
+        # An armed lane fed confident-enough but tied evidence (top two classes
+        # equal, margin 0) stays on the full gate path every call without
+        # consuming a detection.
+        import model_inference as mi
+        n_classes = len(mi.registry.current.class_names)
+        top = 0.5 if n_classes <= 2 else (cfg["ARMED_FIRST_MIN_CONF"] + 0.5) / 2.0
+        probs = [(1.0 - 2 * top) / max(n_classes - 2, 1)] * n_classes
+        probs[0] = probs[1 % n_classes] = top
+        pred = {"present": True, "confidence": top, "probs": probs, "model_version": mi.registry.current.version}
+        gate_lane = camera.CameraLane(f"bench-gate-{name}")
+
+        def arm():
+            # Arm, then latch motion once so the timed calls are _accept_or_reset alone
+            gate_lane.mark_sorting_start()
+            gate_lane._update_background(frame, cfg)
+            gate_lane._update_background(shifted, cfg)
+        arm()
+
+        def gate():
+            i[0] ^= 1
+            if gate_lane._accept_or_reset(pred, toggle[i[0]]).get("present"):
+                arm()  # thresholds leave no candidate band; re-arm
+        results[f"_accept_or_reset[{name}]"] = measure(gate, warmup, repeat)
+    return results
+
+
+def run(args):
+    frames = {f"{w}x{h}": synthetic_frame(w, h) for w, h in args.resolutions}
+    if args.frames:
+        for i, img in enumerate(recorded_frames(args.frames)):
+            h, w = img.shape[:2]
+            frames[f"rec{i}-{w}x{h}"] = img
+
+    results = {}
+    results.update(bench_model(frames, args.batch_sizes, args.warmup, args.repeat))
+    results.update(bench_gating(frames, args.warmup, args.repeat))
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": platform.platform(),
+        "python": platform.python_version(),
+        "warmup": args.warmup,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    width = max(len(k) for k in results)
+    print(f"{'benchmark':{width}}  {'median':>9}  {'mean':>9}  {'p95':>9}  {'stdev':>8}")
+    for key, r in results.items():
+        print(f"{key:{width}}  {r['median_ms']:9.3f}  {r['mean_ms']:9.3f}  {r['p95_ms']:9.3f}  {r['stdev_ms']:8.3f}")
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)["results"]
+    with open(args.new) as f:
+        new = json.load(f)["results"]
+
+    regressions = 0
+    width = max(len(k) for k in new) if new else 10
+    print(f"{'benchmark':{width}}  {'old':>9}  {'new':>9}  {'change':>8}")
+    for key in sorted(set(old) & set(new)):
+        o, n = old[key]["median_ms"], new[key]["median_ms"]
+        change = (n - o) / o * 100.0 if o else 0.0
+        # Only flag changes larger than both the threshold and the old run's noise (IQR).
+        flag = change > args.threshold and (n - o) > old[key].get("iqr_ms", 0.0)
+        regressions += flag
+        print(f"{key:{width}}  {o:9.3f}  {n:9.3f}  {change:+7.1f}%{'  REGRESSION' if flag else ''}")
+    for key in sorted(set(new) - set(old)):
+        print(f"{key:{width}}  {'-':>9}  {new[key]['median_ms']:9.3f}  (new)")
+    if regressions:
+        print(f"\n{regressions} regression(s) over {args.threshold:.0f}%")
+        raise SystemExit(1)
+    print("\nNo regressions.")
+
+
+def _resolution(text):
+    w, _, h = text.lower().partition("x")
+    return int(w), int(h)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmarks for model_inference and camera gating.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="run the benchmarks and write JSON")
+    p_run.add_argument("--out", default="bench_output.json")
+    p_run.add_argument("--frames", help="folder of recorded frames to benchmark as well")
+    p_run.add_argument("--resolutions", type=_resolution, nargs="+", default=RESOLUTIONS)
+    p_run.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    p_run.add_argument("--warmup", type=int, default=WARMUP)
+    p_run.add_argument("--repeat", type=int, default=REPEAT)
+    p_run.set_defaults(func=run)
+
+    p_cmp = sub.add_parser("compare", help="flag regressions between two result files")
+    p_cmp.add_argument("old")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--threshold", type=float, default=REGRESSION_PCT, help="percent slowdown to flag")
+    p_cmp.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,209 @@
 # camera.py
+import asyncio
+import json
+import struct
 import time
-from datetime import datetime
+import numpy as np
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from pathlib import Path
+from queue import Queue, Empty
 from threading import Thread, Lock
 
 # =========================
 # TUNABLE THRESHOLDS (softer, easier to detect)
 # =========================
 MIN_PRESENT_STREAK      = 1     # consecutive passes required (debounce)
-CLASS_STABILITY         = 1     # same class this many times in a row
+EVIDENCE_ACCEPT_MARGIN  = 0.69  # accept once summed log-probs put the top class this far ahead of the runner-up (ln 2)
+EVIDENCE_MIN_PROB       = 1e-6  # probabilities are floored at this before taking logs
 ARMED_FIRST_MIN_CONF    = 0.40  # min confidence for first detection after arming
 MOTION_SCORE_THRESHOLD  = 1.0   # motion score to consider "object moved in"
 SCENE_LAP_VAR_MIN       = 10.0  # edge richness gate
 SCENE_STD_MIN           = 5.0   # contrast gate
-BASELINE_LAP_DELTA_MIN  = 5.0   # change vs baseline (edges)
-BASELINE_STD_DELTA_MIN  = 2.0   # change vs baseline (contrast)
+
+# =========================
+# BACKGROUND MODEL (empty-belt gate, runs on every frame before inference)
+# =========================
+BG_SIZE                 = (160, 120)  # grayscale grid the background is kept at
+BG_ALPHA                = 0.05  # learning rate of the per-pixel mean/variance
+BG_STATIC_DIFF_MAX      = 2.0   # frame-to-frame mean abs diff below which a frame is "static" (learnable)
+BG_FG_SIGMA             = 3.0   # pixel is foreground beyond this many std devs from the mean
+BG_MIN_VAR              = 16.0  # variance floor (sensor noise)
+BG_WARMUP_FRAMES        = 10    # static frames learned before the gate is trusted
+BG_RELEARN_FRACTION     = 0.85  # static frame this different everywhere = new scene, relearn all pixels
+FG_SCORE_MIN            = 0.02  # foreground fraction needed to run the model at all
+
+# =========================
+# INFERENCE SCHEDULER
+# =========================
+INFER_INTERVAL_S        = 0.5   # per-lane time between inferences
+BATCH_MAX_SIZE          = 4     # max frames per batched session.run
+BATCH_WINDOW_S          = 0.02  # how long to wait for other lanes to join a batch
+BATCH_BEHIND_S          = 0.25  # a frame queued longer than this = inference is behind; single view
+
+# =========================
+# PREVIEW STREAM (MJPEG) TIERS
+# =========================
+# Frames are only JPEG-encoded for tiers somebody is watching, at most `fps`
+# times a second, after downscaling to `width`. Everything else goes to inference.
+PREVIEW_TIERS = {
+    "low":    {"width": 320, "quality": 50, "fps": 5},
+    "medium": {"width": 480, "quality": 60, "fps": 10},
+    "high":   {"width": 640, "quality": 70, "fps": 15},
+}
+DEFAULT_PREVIEW_TIER = "high"  # what clients get without ?tier=; low/medium are opt-in
+STREAM_POLL_S        = 0.02        # viewers check for a new preview frame this often
+PICAM_LORES_SIZE     = (320, 240)  # Picamera2 lores stream, feeds tiers no wider than this
+PICAM_HW_MJPEG       = True        # use the Pi's hardware MJPEG encoder for the lores tier
+
+# =========================
+# SESSION RECORDER (record-and-replay, see replay.py)
+# =========================
+RECORD_ENABLED       = False      # record every lane from startup
+RECORD_DIR           = Path(__file__).resolve().parent / "recordings"
+RECORD_SEGMENT_S     = 60.0       # start a new segment file this often
+RECORD_MAX_BYTES     = 2 * 1024 ** 3  # per lane; oldest segments are deleted past this
+RECORD_JPEG_QUALITY  = 85
+RECORD_QUEUE_SIZE    = 60         # pending records before frames are dropped
+
+# =========================
+# CAPTURE WATCHDOG
+# =========================
+CAPTURE_BACKOFF_MIN_S   = 1.0    # first restart delay after a capture loop dies
+CAPTURE_BACKOFF_MAX_S   = 30.0   # delay doubles per consecutive failure, up to this
+CAPTURE_HEALTHY_S       = 60.0   # a run at least this long resets the backoff
+READ_FAIL_LIMIT         = 40     # consecutive failed reads (~2 s) before the camera is reopened
+STALL_AFTER_S           = 5.0    # no new frame for this long = stalled (also the /video_feed stale mark)
+STALL_RESTART_S         = 15.0   # stalled this long = start a fresh capture thread
+INFER_TIMEOUT_S         = 10.0   # a prediction not back by then is an inference error (capture keeps running)
+WATCHDOG_INTERVAL_S     = 1.0
+HEALTH_STAGES           = ("capture", "inference", "preview")
+
+DEFAULT_LANE = "0"
+
+# Optional JSON overrides for the thresholds above, hot-reloaded on change.
+GATE_CONFIG_PATH = Path(__file__).resolve().parent / "artifacts" / "gate.json"
+GATE_WATCH_INTERVAL_S = 2.0
+
 
 # -------------------------
-# GLOBALS
+# Reloadable gate config
 # -------------------------
-_latest = None                       # last JPEG bytes for MJPEG stream
-_lock = Lock()
-_running = False
-
-latest_result = {"present": False, "seq": 0}  # shared inference result
-_result_lock = Lock()
-_last_infer_time = 0.0
-_seq = 0
+class GateConfig:
+    """
+    Live gate thresholds. Defaults are the module constants above; overrides
+    come from GATE_CONFIG_PATH or the admin endpoint. Every update builds a
+    fresh dict and swaps the reference, so a frame being gated always sees one
+    consistent set of values and capture never pauses.
+    """
 
-# Debounce & class stability
-_present_streak = 0
-_class_window = []
+    KEYS = (
+        "MIN_PRESENT_STREAK", "EVIDENCE_ACCEPT_MARGIN",
+        "ARMED_FIRST_MIN_CONF", "MOTION_SCORE_THRESHOLD", "SCENE_LAP_VAR_MIN",
+        "SCENE_STD_MIN", "BG_ALPHA", "BG_STATIC_DIFF_MAX", "BG_FG_SIGMA", "FG_SCORE_MIN",
+        "INFER_INTERVAL_S",
+    )
+    # Allowed (min, max) per key, inclusive; None = unbounded
+    RANGES = {
+        "MIN_PRESENT_STREAK":     (1, 100),
+        "EVIDENCE_ACCEPT_MARGIN": (0.0, 50.0),
+        "ARMED_FIRST_MIN_CONF":   (0.0, 1.0),
+        "MOTION_SCORE_THRESHOLD": (0.0, 255.0),
+        "SCENE_LAP_VAR_MIN":      (0.0, None),
+        "SCENE_STD_MIN":          (0.0, 255.0),
+        "BG_ALPHA":               (0.001, 1.0),
+        "BG_STATIC_DIFF_MAX":     (0.0, 255.0),
+        "BG_FG_SIGMA":            (0.1, 100.0),
+        "FG_SCORE_MIN":           (0.0, 1.0),
+        "INFER_INTERVAL_S":       (0.0, 60.0),
+    }
 
-# Motion & scene state
-_prev_gray = None
-_motion_score = 0.0
-_motion_after_armed = False
-_motion_lock = Lock()
+    def __init__(self, path=GATE_CONFIG_PATH):
+        self.path = Path(path)
+        self._defaults = {k: globals()[k] for k in self.KEYS}
+        self._current = dict(self._defaults)
+        self._lock = Lock()
+        self._watch_thread = None
+        self.last_error = None
+        if self.path.exists():
+            self.reload()
+
+    @property
+    def current(self) -> dict:
+        return self._current
+
+    def _validated(self, updates: dict) -> dict:
+        unknown = set(updates) - set(self.KEYS)
+        if unknown:
+            raise ValueError(f"unknown gate keys: {', '.join(sorted(unknown))}")
+        out = {}
+        for key, value in updates.items():
+            cast = type(self._defaults[key])
+            try:
+                out[key] = cast(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a {cast.__name__}")
+            lo, hi = self.RANGES[key]
+            # written so NaN fails too
+            if not ((lo is None or out[key] >= lo) and (hi is None or out[key] <= hi)):
+                raise ValueError(f"{key} must be between {lo} and {'inf' if hi is None else hi}")
+        return out
+
+    def update(self, updates: dict) -> dict:
+        """Apply overrides on top of the current values; returns the new config."""
+        clean = self._validated(updates or {})
+        with self._lock:
+            new = dict(self._current)
+            new.update(clean)
+            self._current = new
+        return new
+
+    def reload(self) -> dict:
+        """Re-read GATE_CONFIG_PATH (missing file = defaults)."""
+        try:
+            overrides = {}
+            if self.path.exists():
+                with open(self.path, "r") as f:
+                    overrides = json.load(f) or {}
+            clean = self._validated(overrides)
+            with self._lock:
+                new = dict(self._defaults)
+                new.update(clean)
+                self._current = new
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"[ERROR] Gate config reload failed, keeping current values: {self.last_error}")
+        return self._current
+
+    def start_watching(self, interval=GATE_WATCH_INTERVAL_S):
+        """Poll GATE_CONFIG_PATH and reload when its mtime changes."""
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
 
-# Baseline scene snapshot taken at Start Sorting
-_baseline = {"std": None, "lap": None}
-_baseline_lock = Lock()
+        def mtime():
+            try:
+                return self.path.stat().st_mtime
+            except OSError:
+                return None
 
-# Armed window (set by Start Sorting)
-_armed = False
-_armed_token = 0
-_armed_time = 0.0
+        def watch():
+            seen = mtime()
+            while True:
+                time.sleep(interval)
+                now = mtime()
+                if now != seen:
+                    seen = now
+                    self.reload()
 
-# Crop selection for inference (fallback only)
-_current_crop = "tomato"
+        self._watch_thread = Thread(target=watch, name="gate-config-watch", daemon=True)
+        self._watch_thread.start()
 
 # -------------------------
 # Model Inference
 # -------------------------
-from model_inference import predict  # must return keys: present, confidence, crop_type, etc.
+from model_inference import predict_batch, class_fields, registry as model_registry  # one result dict per frame (same keys as predict)
+import snapshot_archive
 
 # -------------------------
 # Camera backend selection
@@ -60,6 +211,8 @@ from model_inference import predict  # must return keys: present, confidence, cr
 _USE_PICAM = False
 try:
     from picamera2 import Picamera2
+    from picamera2.encoders import MJPEGEncoder
+    from picamera2.outputs import Output
     from libcamera import controls
     _USE_PICAM = True
 except Exception:
@@ -70,106 +223,1094 @@ if not _USE_PICAM:
 
 
 # -------------------------
-# Public helpers used by Flask
+# Shared batched inference
 # -------------------------
-def set_current_crop(name: str):
-    """Allow UI/API to set currently targeted crop to improve defaults."""
-    global _current_crop
-    _current_crop = (name or "").lower().strip()
-
-
-def get_latest_result() -> dict:
+class _InferenceScheduler:
     """
-    Thread-safe copy of the latest inference payload.
-    IMPORTANT: while 'armed', suppress any result whose seq <= _armed_token.
-    This prevents UI from showing cached values immediately after Start.
+    Single inference worker shared by all lanes. Each lane submits a frame and
+    checks the returned Future from its capture loop; frames that arrive within
+    BATCH_WINDOW_S of each other are classified in one predict_batch() call.
     """
-    with _result_lock:
-        res = dict(latest_result)
-    if _armed:
-        # Suppress display until a brand-new detection (seq > token)
-        if (not res.get("present")) or int(res.get("seq", 0)) <= int(_armed_token):
-            return {
-                "present": False,
-                "seq": res.get("seq", 0),
-                "confidence": float(res.get("confidence", 0.0)),
-            }
-    return res
-
-
-def mark_sorting_start() -> int:
+
+    def __init__(self):
+        self._queue = Queue()
+        self._thread = None
+        self._start_lock = Lock()
+
+    def submit(self, frame) -> Future:
+        self._ensure_worker()
+        fut = Future()
+        self._queue.put((frame, fut, time.time()))
+        return fut
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._worker, daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        # Only wait for stragglers when other lanes could plausibly join.
+        expected = min(BATCH_MAX_SIZE, max(1, _running_lane_count()))
+        deadline = time.time() + BATCH_WINDOW_S
+        while len(batch) < expected:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        while len(batch) < BATCH_MAX_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            try:
+                # Lanes keep one frame in flight, so the queue rarely backs up; a frame
+                # that sat waiting for the previous batch is what "behind" looks like
+                behind = time.time() - min(t for _, _, t in batch) > BATCH_BEHIND_S
+                results = predict_batch([frame for frame, _, _ in batch], single_view=behind)
+                for (_, fut, _), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+
+_scheduler = _InferenceScheduler()
+gate_config = GateConfig()
+
+
+# -------------------------
+# Background model
+# -------------------------
+class _BackgroundModel:
     """
-    Called by /start_sorting. Clears cached detection, resets gates, arms motion check.
-    Returns the current seq token.
+    Running per-pixel mean/variance of the empty scene at BG_SIZE. update()
+    runs on every frame and yields a foreground mask/score. Only static frames
+    are learned from, and only on background pixels, so slow lighting and AWB
+    drift is absorbed while a crop held in view is not. A uniform brightness
+    shift (exposure change) is removed before comparing.
     """
-    global _present_streak, _armed, _armed_token, _armed_time
-    global _motion_after_armed, _class_window, _prev_gray
 
-    with _result_lock:
-        token = latest_result.get("seq", 0)
-        latest_result.clear()
-        latest_result.update({"present": False, "seq": token, "confidence": 0.0})
+    def __init__(self):
+        self.reset()
 
-    _present_streak = 0
-    _class_window = []
-    _armed = True
-    _armed_token = token
-    _armed_time = time.time()
+    def reset(self):
+        self.mean = None
+        self.var = None
+        self.mask = None
+        self.score = 0.0    # foreground fraction of the last frame
+        self.motion = 0.0   # mean abs diff vs the previous frame
+        self.learned = 0
+        self._prev = None
 
-    with _motion_lock:
-        _motion_after_armed = False  # must see motion AFTER arming
+    @property
+    def ready(self) -> bool:
+        return self.learned >= BG_WARMUP_FRAMES
 
-    # force baseline & motion to reinitialize on next frames
-    with _baseline_lock:
-        _baseline["lap"] = None
-        _baseline["std"] = None
-    _prev_gray = None
-    return token
+    def update(self, frame, cfg) -> float:
+        import cv2
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, BG_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+        prev, self._prev = self._prev, small
+        self.motion = float(np.abs(small - prev).mean()) if prev is not None else 0.0
+
+        if self.mean is None:
+            self.mean = small.copy()
+            self.var = np.full_like(small, BG_MIN_VAR)
+            self.mask = np.zeros(small.shape, dtype=bool)
+            self.score = 0.0
+            self.learned = 1
+            return self.score
+
+        diff = small - self.mean
+        diff -= np.median(diff)
+        fg = diff * diff > (cfg["BG_FG_SIGMA"] ** 2) * np.maximum(self.var, BG_MIN_VAR)
+        score = float(fg.mean())
+
+        if prev is not None and self.motion <= cfg["BG_STATIC_DIFF_MAX"]:
+            learn = ~fg if score < BG_RELEARN_FRACTION else np.ones_like(fg)
+            a = cfg["BG_ALPHA"]
+            d = (small - self.mean)[learn]
+            self.mean[learn] += a * d
+            self.var[learn] = (1.0 - a) * (self.var[learn] + a * d * d)
+            self.learned += 1
+
+        self.mask = fg
+        self.score = score
+        return score
 
 
-def detect_crop() -> dict | None:
+# -------------------------
+# Session recorder
+# -------------------------
+class SessionRecorder:
     """
-    Return a UI/DB-ready record ONLY when a crop is actually present
-    (all gates passed and debounced). Otherwise return None.
+    Rolling on-disk log of what one lane saw and decided: JPEG frames,
+    predict() outputs, gate decisions and arm events, in capture order.
+    Encoding and writing happen on a worker thread; when it falls behind,
+    frames are dropped (and counted) rather than stalling capture. Segments
+    rotate every RECORD_SEGMENT_S and the oldest are deleted once the lane's
+    directory exceeds RECORD_MAX_BYTES. read_recording() reads them back.
+    close() lets the worker write what is already queued, then closes the
+    open segment and ends the thread.
     """
-    res = get_latest_result()
-    if not res.get("present"):
+
+    def __init__(self, lane: str, root=RECORD_DIR, max_bytes=RECORD_MAX_BYTES, segment_s=RECORD_SEGMENT_S):
+        self.lane = str(lane)
+        self.dir = Path(root) / self.lane
+        self.max_bytes = max_bytes
+        self.segment_s = segment_s
+        self._queue = Queue()
+        self._thread = None
+        self._start_lock = Lock()
+        self.recorded = 0
+        self.dropped = 0
+        self.last_error = None
+        self._closed = False
+
+    def frame(self, n: int, t: float, frame):
+        if self._queue.qsize() >= RECORD_QUEUE_SIZE:
+            self.dropped += 1
+            return
+        self._put({"type": "frame", "n": n, "t": t}, frame)
+
+    def event(self, kind: str, n: int, t: float, **fields):
+        """Non-frame record (predict / decision / arm); never dropped."""
+        self._put({"type": kind, "n": n, "t": t, **fields})
+
+    def stats(self) -> dict:
+        return {
+            "dir": str(self.dir),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        with self._start_lock:
+            self._closed = True
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put((None, None))  # sentinel: behind everything already queued
+
+    def _put(self, meta, frame=None):
+        if self._closed:
+            return
+        self._ensure_worker()
+        self._queue.put((meta, frame))
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._closed:
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._worker, name=f"recorder-{self.lane}", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        import cv2
+        fh, seg_start = None, 0.0
+        while True:
+            meta, frame = self._queue.get()
+            if meta is None:
+                if fh is not None:
+                    fh.close()
+                return
+            try:
+                blob = b""
+                if frame is not None:
+                    ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), RECORD_JPEG_QUALITY])
+                    if not ok:
+                        continue
+                    blob = buf.tobytes()
+                if fh is None or meta["t"] - seg_start >= self.segment_s:
+                    if fh is not None:
+                        fh.close()
+                    fh, seg_start = self._open_segment(meta["t"]), meta["t"]
+                fh.write(_pack_record(meta, blob))
+                if frame is not None:
+                    self.recorded += 1
+                if self._queue.empty():
+                    fh.flush()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"[ERROR] Recorder (lane {self.lane}): {self.last_error}")
+
+    def _open_segment(self, t):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        segments = sorted(self.dir.glob("*.rec"))
+        total = sum(p.stat().st_size for p in segments)
+        while segments and total > self.max_bytes:
+            oldest = segments.pop(0)
+            total -= oldest.stat().st_size
+            oldest.unlink()
+        # Microsecond names keep segments unique and in chronological sort order;
+        # "xb" never appends to an existing segment
+        stamp = datetime.fromtimestamp(t)
+        while True:
+            path = self.dir / f"{stamp.strftime('%Y%m%d-%H%M%S-%f')}.rec"
+            try:
+                fh = open(path, "xb")
+                break
+            except FileExistsError:
+                stamp += timedelta(microseconds=1)
+        # Each segment starts with the settings needed to interpret it
+        from model_inference import registry
+        fh.write(_pack_record({
+            "type": "config", "n": 0, "t": t, "lane": self.lane,
+            "gate": gate_config.current, "class_names": list(registry.current.class_names),
+        }, b""))
+        return fh
+
+
+def _pack_record(meta: dict, blob: bytes) -> bytes:
+    """<json length><blob length><json><blob>, lengths as big-endian uint32."""
+    head = json.dumps(meta, separators=(",", ":")).encode()
+    return struct.pack(">II", len(head), len(blob)) + head + blob
+
+
+def read_recording(path, frames=True):
+    """
+    Yield (meta, jpeg_bytes) from one .rec segment, or from every segment in
+    a directory (oldest first). frames=False skips the JPEG bytes (yields b"").
+    A truncated final record (crash) ends the file.
+    """
+    path = Path(path)
+    files = sorted(path.glob("*.rec")) if path.is_dir() else [path]
+    for file in files:
+        size = file.stat().st_size
+        with open(file, "rb") as fh:
+            while True:
+                lengths = fh.read(8)
+                if len(lengths) < 8:
+                    break
+                n_head, n_blob = struct.unpack(">II", lengths)
+                head = fh.read(n_head)
+                if frames:
+                    blob = fh.read(n_blob)
+                else:
+                    blob = b"" if fh.seek(n_blob, 1) <= size else None
+                if len(head) < n_head or blob is None or (frames and len(blob) < n_blob):
+                    break
+                yield json.loads(head), blob
+
+
+# -------------------------
+# Camera lane
+# -------------------------
+class CameraLane:
+    """
+    One camera (OpenCV index or Picamera) feeding one conveyor lane.
+    Each lane owns its own gating state, seq space and MJPEG stream.
+    `source` replaces the camera with a callable returning BGR frames
+    (None = no frame yet), e.g. a synthetic source for load tests.
+    """
+
+    def __init__(self, name: str, index=0, source=None, source_fps: float = 15.0):
+        self.name = name
+        self.index = index
+        self.source = source
+        self.source_fps = source_fps
+
+        # Counters (read by /lanes and the load-test / benchmark tools)
+        self.frames_captured = 0
+        self.inference_count = 0
+        self.accepted_count = 0
+        self.skipped_count = 0    # inference slots skipped by the empty-belt gate
+
+        # Optional record-and-replay log (start_recording / stop_recording)
+        self.recorder = SessionRecorder(name) if RECORD_ENABLED else None
+
+        # MJPEG preview: tier -> (frame_no, JPEG bytes), only for watched tiers
+        self._preview = {}
+        self._subscribers = {}                    # tier -> active viewers
+        self._last_encode = {}                    # tier -> time of last encode
+        self._hw_tiers = set()                    # tiers fed by a hardware encoder
+        self._hw_failed = False
+        self._frame_no = 0
+        self._lock = Lock()
+        self._running = False
+
+        # Supervision: capture runs under _supervise(); the watchdog checks heartbeats
+        self.restarts = 0
+        self._state = "stopped"      # stopped / starting / running / stalled / backoff
+        self._generation = 0         # bumped per capture thread; older threads exit
+        self._spawned_at = 0.0
+        self._stages = {s: {"beat": None, "errors": 0, "last_error": None, "failed_at": None}
+                        for s in HEALTH_STAGES}
+
+        self.latest_result = {"present": False, "seq": 0}  # shared inference result
+        self._result_lock = Lock()
+        self._last_infer_time = 0.0
+        self._last_skip_time = 0.0   # last inference slot skipped by the empty-belt gate
+        self._pending = None         # in-flight prediction: future, frame, n, t, late
+        self._seq = 0
+
+        # Debounce & accumulated class evidence for the current candidate object
+        self._present_streak = 0
+        self._evidence = None        # summed log-probs while gates keep passing
+        self._evidence_version = None  # model bundle the evidence came from
+
+        # Motion & scene state (background model is updated by the capture thread only)
+        self._background = _BackgroundModel()
+        self._motion_after_armed = False
+        self._motion_lock = Lock()
+
+        # Armed window (set by Start Sorting)
+        self._armed = False
+        self._armed_token = 0
+        self._armed_time = 0.0
+
+        # Crop selection for inference (fallback only)
+        self._current_crop = "tomato"
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def armed_token(self) -> int:
+        return self._armed_token
+
+    @property
+    def foreground_score(self) -> float:
+        return self._background.score
+
+    @property
+    def frame_age(self) -> float | None:
+        """Seconds since the last captured frame (None before the first one)."""
+        beat = self._stages["capture"]["beat"]
+        return None if beat is None else time.time() - beat
+
+    @property
+    def healthy(self) -> bool:
+        age = self.frame_age
+        return self._running and self._state == "running" and age is not None and age < STALL_AFTER_S
+
+    @property
+    def inference_overdue_s(self) -> float | None:
+        """How long the in-flight prediction has been overdue (None if there is none)."""
+        p = self._pending
+        if p is None or p["future"].done():
+            return None
+        overdue = time.time() - p["t"] - INFER_TIMEOUT_S
+        return round(overdue, 2) if overdue > 0 else None
+
+    def health(self) -> dict:
+        now = time.time()
+        return {
+            "lane": self.name,
+            "state": self._state,
+            "running": self._running,
+            "healthy": self.healthy,
+            "restarts": self.restarts,
+            "frames_captured": self.frames_captured,
+            "inference_overdue_s": self.inference_overdue_s,
+            "stages": {
+                stage: {
+                    "age_s": round(now - info["beat"], 2) if info["beat"] else None,
+                    "errors": info["errors"],
+                    "last_error": info["last_error"],
+                    "error_age_s": round(now - info["failed_at"], 2) if info["failed_at"] else None,
+                }
+                for stage, info in self._stages.items()
+            },
+        }
+
+    def resume_seq(self, floor: int):
+        """Number new detections after `floor` (the highest seq an earlier run stored)."""
+        with self._result_lock:
+            self._seq = max(self._seq, int(floor or 0))
+
+    def start_recording(self) -> SessionRecorder:
+        if self.recorder is None:
+            self.recorder = SessionRecorder(self.name)
+        return self.recorder
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    # -------------------------
+    # Public helpers used by Flask
+    # -------------------------
+    def set_current_crop(self, name: str):
+        """Allow UI/API to set currently targeted crop to improve defaults."""
+        self._current_crop = (name or "").lower().strip()
+
+    def get_latest_result(self) -> dict:
+        """
+        Thread-safe copy of the latest inference payload.
+        IMPORTANT: while 'armed', suppress any result whose seq <= _armed_token.
+        This prevents UI from showing cached values immediately after Start.
+        """
+        with self._result_lock:
+            res = dict(self.latest_result)
+        if self._armed:
+            # Suppress display until a brand-new detection (seq > token)
+            if (not res.get("present")) or int(res.get("seq", 0)) <= int(self._armed_token):
+                return {
+                    "present": False,
+                    "seq": res.get("seq", 0),
+                    "confidence": float(res.get("confidence", 0.0)),
+                }
+        return res
+
+    def mark_sorting_start(self, now=None) -> int:
+        """
+        Called by /start_sorting. Clears cached detection, resets gates, arms motion check.
+        Returns the current seq token.
+        """
+        now = now or time.time()
+        with self._result_lock:
+            token = self.latest_result.get("seq", 0)
+            self.latest_result.clear()
+            self.latest_result.update({"present": False, "seq": token, "confidence": 0.0})
+
+        self._present_streak = 0
+        self._evidence = None
+        p = self._pending  # read once: the capture thread may clear it meanwhile
+        if p is not None:
+            p["late"] = True  # submitted before arming: do not gate on it
+        self._armed = True
+        self._armed_token = token
+        self._armed_time = now
+
+        with self._motion_lock:
+            self._motion_after_armed = False  # must see motion AFTER arming
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.event("arm", self.frames_captured, now, token=token)
+        return token
+
+    def detect_crop(self) -> dict | None:
+        """
+        Return a UI/DB-ready record ONLY when a crop is actually present
+        (all gates passed and debounced). Otherwise return None.
+        """
+        res = self.get_latest_result()
+        if not res.get("present"):
+            return None
+
+        crop_type_raw = (res.get('crop_type') or '').lower()
+        color_raw = (res.get('color') or '').lower()
+
+        # Normalize crop type (trust model; fallback to dropdown)
+        if 'pepper' in crop_type_raw or 'bellpep' in crop_type_raw or 'bell pepper' in crop_type_raw:
+            crop_type = 'Bell Pepper'
+        elif 'tomato' in crop_type_raw:
+            crop_type = 'Tomato'
+        else:
+            crop_type = self._current_crop.capitalize() if self._current_crop else 'Unknown'
+
+        # Normalize color with safe defaults by crop
+        if 'red' in color_raw:
+            color = 'Red'
+        elif 'green' in color_raw:
+            color = 'Green'
+        else:
+            color = 'Red' if crop_type == 'Bell Pepper' else ('Green' if crop_type == 'Tomato' else '')
+
+        return {
+            'crop_type':     crop_type,
+            'condition':     res.get('condition', ''),
+            'color':         color,
+            'sorted_to':     res.get('sorted_to', ''),
+            'size':          res.get('size', ''),
+            'time_detected': res.get('time_detected', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            'confidence':    float(res.get('confidence', 0.0)),
+            'seq':           int(res.get('seq', 0)),
+            'lane':          self.name,
+        }
+
+    # -------------------------
+    # Internal helpers
+    # -------------------------
+    def _scene_has_object(self, frame, cfg) -> bool:
+        """Reject very flat/blank frames."""
+        try:
+            _, lap_var, std = _scene_stats(frame)
+            return lap_var > cfg["SCENE_LAP_VAR_MIN"] and std > cfg["SCENE_STD_MIN"]
+        except Exception:
+            # Fail-open so we don't block detection if stats fail for any reason
+            return True
+
+    def _foreground_ok(self, cfg) -> bool:
+        """Enough of the frame differs from the learned empty scene."""
+        bg = self._background
+        if not bg.ready:
+            return True  # still learning -> don't block
+        return bg.score >= cfg["FG_SCORE_MIN"]
+
+    def _update_background(self, frame, cfg):
+        """Feed the background model; latch motion seen after arming."""
+        try:
+            self._background.update(frame, cfg)
+        except Exception:
+            return
+        with self._motion_lock:
+            if self._armed and self._background.motion > cfg["MOTION_SCORE_THRESHOLD"]:
+                self._motion_after_armed = True
+
+    def _accept_or_reset(self, pred: dict, frame) -> dict:
+        """
+        Combine:
+          - model confidence gate (handled in model_inference)
+          - scene gate (edges/contrast)
+          - foreground vs the learned background
+          - motion gate (must see motion after arming)
+          - class evidence (summed log-probs: top class EVIDENCE_ACCEPT_MARGIN ahead of the runner-up)
+          - debounce (N consecutive frames)
+        Returns either a full payload (present=True) or {present: False}.
+        """
+        cfg = gate_config.current          # one consistent snapshot per frame
+        conf = float(pred.get("confidence", 0.0))
+        model_present = bool(pred.get("present", False))
+        scene_ok = self._scene_has_object(frame, cfg)
+        foreground_ok = self._foreground_ok(cfg)
+        with self._motion_lock:
+            motion_ok = bool(self._motion_after_armed)
+
+        # FIRST detection after Start Sorting must be extra confident
+        if self._armed and conf < cfg["ARMED_FIRST_MIN_CONF"]:
+            model_present = False
+
+        probs = pred.get("probs")
+
+        # Basic gates
+        if not (model_present and scene_ok and foreground_ok and motion_ok and probs):
+            self._present_streak = 0
+            self._evidence = None
+            return {"present": False, "seq": self.latest_result.get("seq", 0), "confidence": conf}
+
+        # Evidence (and its class order) belongs to one model bundle; a hot
+        # reload starts a fresh candidate.
+        version = pred.get("model_version")
+        if version != self._evidence_version:
+            self._evidence = None
+            self._evidence_version = version
+
+        # Accumulate evidence for this candidate object. Summing log-probs means
+        # each agreeing frame widens the top class's lead (its log-odds over the
+        # runner-up); a clear single frame (p1 >= 2 * p2) is accepted at once.
+        logp = np.log(np.clip(np.asarray(probs, dtype=np.float64), EVIDENCE_MIN_PROB, 1.0))
+        if self._evidence is None or self._evidence.shape != logp.shape:
+            self._evidence = logp
+        else:
+            self._evidence = self._evidence + logp
+        ranked = np.argsort(self._evidence)
+        best = int(ranked[-1])
+        margin = float(self._evidence[best] - self._evidence[ranked[-2]]) if len(ranked) > 1 else np.inf
+        if margin < cfg["EVIDENCE_ACCEPT_MARGIN"]:
+            return {"present": False, "seq": self.latest_result.get("seq", 0), "confidence": conf}
+        evidence_conf = float(1.0 / np.exp(self._evidence - self._evidence[best]).sum())  # posterior of best
+
+        # Evidence crossed the threshold; count toward streak
+        self._present_streak += 1
+        if self._present_streak < cfg["MIN_PRESENT_STREAK"]:
+            return {"present": False, "seq": self.latest_result.get("seq", 0), "confidence": conf}
+
+        # Accept new detection (brand-new seq), labelled by the accumulated
+        # evidence with the class list of the model that produced it
+        model = model_registry.bundle(version)
+        if model is None:
+            self._present_streak = 0
+            self._evidence = None
+            return {"present": False, "seq": self.latest_result.get("seq", 0), "confidence": conf}
+        fields = class_fields(best, model)
+        self._seq += 1
+        payload = {
+            "present":       True,
+            "seq":           self._seq,
+            "crop_type":     fields["crop_type"] or self._current_crop,
+            "condition":     fields["condition"],
+            "color":         fields["color"],
+            "sorted_to":     fields["sorted_to"],
+            "size":          fields["size"],
+            "time_detected": pred.get("time_detected") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "confidence":    evidence_conf,
+        }
+        # Keep the frame for audit/retraining (async, drops instead of blocking)
+        if snapshot_archive.ARCHIVE_ENABLED:
+            snapshot_archive.archive.submit(self.name, self._seq, frame)
+
+        # consume this detection once
+        self._present_streak = 0
+        self._evidence = None
+        self._armed = False  # leave armed-mode on first accepted detection
+        return payload
+
+    def _update_latest(self, res: dict):
+        """Atomically replace the shared latest_result dict."""
+        with self._result_lock:
+            self.latest_result.clear()
+            self.latest_result.update(res)
+
+    def _predict(self, frame) -> Future:
+        """Future with the model output for one frame (replay.py swaps in recorded outputs)."""
+        return _scheduler.submit(frame)
+
+    def _record(self, kind, now, n=None, **fields):
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.event(kind, self.frames_captured if n is None else n, now, **fields)
+
+    def _maybe_infer(self, frame, now):
+        """
+        Submit a frame for batched inference at most every INFER_INTERVAL_S,
+        one at a time per lane, and gate the result on whichever frame it
+        comes back by. Capture never waits for the model.
+        """
+        cfg = gate_config.current
+        if self._pending is None and now - self._last_infer_time > cfg["INFER_INTERVAL_S"]:
+            if not self._foreground_ok(cfg):
+                # Empty belt: skip the model. The slot stays open, so the
+                # first frame with foreground is classified without waiting.
+                if self._present_streak or self._evidence is not None or self.latest_result.get("present"):
+                    self._present_streak = 0
+                    self._evidence = None
+                    self._update_latest({"present": False, "seq": self.latest_result.get("seq", 0), "confidence": 0.0})
+                if now - self._last_skip_time > cfg["INFER_INTERVAL_S"]:
+                    # Counted and logged once per slot, not once per captured frame
+                    self._last_skip_time = now
+                    self.skipped_count += 1
+                    self._record("decision", now, skipped=True, result={"present": False})
+                    self._beat("inference")
+                return
+            self._last_infer_time = now  # also on failure, so a slow model is not resubmitted every frame
+            self._pending = {"future": self._predict(frame), "frame": frame,
+                             "n": self.frames_captured, "t": now, "late": False}
+        if self._pending is not None:
+            self._collect_prediction(now)
+
+    def _collect_prediction(self, now):
+        """Gate the in-flight prediction if it is back; report it once if it is overdue."""
+        p = self._pending
+        if not p["future"].done():
+            if not p["late"] and now - p["t"] > INFER_TIMEOUT_S:
+                # Nothing new is submitted until it returns; its result is then dropped
+                p["late"] = True
+                raise TimeoutError(f"no prediction after {INFER_TIMEOUT_S:.0f}s")
+            return
+        self._pending = None
+        if p["late"]:
+            return
+        pred = p["future"].result()                         # model-level gate (confidence)
+        gated = self._accept_or_reset(pred, p["frame"])    # all gates + evidence + debounce
+        # Logged against the frame that was classified (replay keys on it)
+        self._record("predict", p["t"], n=p["n"], pred=pred)
+        self._record("decision", p["t"], n=p["n"], skipped=False, result=gated)
+        self._update_latest(gated)
+        self.inference_count += 1
+        if gated.get("present"):
+            self.accepted_count += 1
+        self._beat("inference")
+
+    def _process_frame(self, frame, lores=None, now=None):
+        """Per-frame work shared by every capture backend."""
+        now = now or time.time()
+        self.frames_captured += 1
+        self._beat("capture")
+        self._state = "running"
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.frame(self.frames_captured, now, frame)
+        self._update_background(frame, gate_config.current)
+        # A failing stage is counted and reported, it never takes capture down
+        try:
+            self._maybe_infer(frame, now)
+        except Exception as e:
+            self._fail("inference", e)
+        try:
+            self._encode_previews(frame, lores)
+        except Exception as e:
+            self._fail("preview", e)
+
+    def _beat(self, stage):
+        self._stages[stage]["beat"] = time.time()
+
+    def _fail(self, stage, exc):
+        info = self._stages[stage]
+        message = f"{type(exc).__name__}: {exc}"
+        info["errors"] += 1
+        info["failed_at"] = time.time()
+        if message != info["last_error"]:
+            print(f"[ERROR] Lane {self.name} {stage}: {message}")
+        info["last_error"] = message
+
+    # -------------------------
+    # Supervision
+    # -------------------------
+    def _alive(self, gen) -> bool:
+        return self._running and gen == self._generation
+
+    def _spawn_capture(self):
+        self._generation += 1
+        self._spawned_at = time.time()
+        Thread(
+            target=self._supervise,
+            args=(self._generation,),
+            name=f"camera-lane-{self.name}",
+            daemon=True
+        ).start()
+
+    def _supervise(self, gen):
+        """Run the capture loop; restart it with exponential backoff whenever it dies or gives up."""
+        if self.source is not None:
+            loop = self._source_loop
+        else:
+            loop = self._picam_loop if _USE_PICAM else self._opencv_loop
+        delay = CAPTURE_BACKOFF_MIN_S
+        while self._alive(gen):
+            self._state = "starting"
+            started = time.time()
+            try:
+                loop(gen)
+            except Exception as e:
+                self._fail("capture", e)
+            if not self._alive(gen):
+                break
+            if time.time() - started >= CAPTURE_HEALTHY_S:
+                delay = CAPTURE_BACKOFF_MIN_S
+            self.restarts += 1
+            self._state = "backoff"
+            print(f"[WARN] Capture for lane {self.name} stopped; restarting in {delay:.0f}s")
+            end = time.time() + delay
+            while self._alive(gen) and time.time() < end:
+                time.sleep(0.2)
+            delay = min(delay * 2, CAPTURE_BACKOFF_MAX_S)
+        if gen == self._generation and not self._running:
+            self._state = "stopped"
+
+    def _check_stall(self):
+        """Called by the watchdog: flag a lane with no recent frames, then replace its thread."""
+        if not self._running or self._state == "backoff":
+            return
+        last = max(self._stages["capture"]["beat"] or 0.0, self._spawned_at)
+        idle = time.time() - last
+        if idle < STALL_AFTER_S:
+            return
+        self._state = "stalled"
+        if idle >= STALL_RESTART_S:
+            # The old thread may be stuck inside a driver call; it exits
+            # on its own if it ever returns (its generation is stale).
+            print(f"[WARN] Lane {self.name} stalled ({idle:.0f}s without a frame); starting a new capture thread")
+            self._fail("capture", TimeoutError(f"no frame for {idle:.0f}s"))
+            self.restarts += 1
+            self._spawn_capture()
+
+    # -------------------------
+    # Capture loops
+    # -------------------------
+    def _picam_loop(self, gen):
+        import cv2
+
+        picam2 = Picamera2(self.index)
+        cfg = picam2.create_preview_configuration(
+            main={"size": (640, 480), "format": "RGB888"},
+            lores={"size": PICAM_LORES_SIZE, "format": "YUV420"},
+            buffer_count=4
+        )
+        picam2.configure(cfg)
+        picam2.set_controls({
+            "AfMode": controls.AfModeEnum.Continuous,
+            "AwbEnable": True,
+            "AeEnable": True,
+            "AwbMode": 1
+        })
+        picam2.start()
+        hw_encoder = None
+        try:
+            while self._alive(gen):
+                frame = picam2.capture_array()  # RGB888
+
+                hw_encoder = self._sync_hw_preview(picam2, hw_encoder)
+                lores = None
+                if self._wants_lores():
+                    lores = cv2.cvtColor(picam2.capture_array("lores"), cv2.COLOR_YUV2BGR_I420)
+                self._process_frame(frame, lores)
+                time.sleep(0.01)
+        finally:
+            if hw_encoder is not None:
+                try:
+                    picam2.stop_encoder()
+                except Exception:
+                    pass
+            picam2.stop()
+
+    def _opencv_loop(self, gen):
+        import cv2
+
+        cap = cv2.VideoCapture(self.index)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        cap.set(cv2.CAP_PROP_FPS, 15)
+
+        if not cap.isOpened():
+            cap.release()
+            raise RuntimeError(f"camera at index {self.index} could not be opened")
+
+        failures = 0
+        try:
+            while self._alive(gen):
+                ok, frame = cap.read()
+                if not ok:
+                    failures += 1
+                    if failures >= READ_FAIL_LIMIT:
+                        raise RuntimeError(f"{failures} consecutive frame reads failed")
+                    time.sleep(0.05)
+                    continue
+                failures = 0
+
+                self._process_frame(frame)
+                time.sleep(0.01)
+        finally:
+            cap.release()
+
+    def _source_loop(self, gen):
+        """Capture loop for a callable frame source, paced at source_fps."""
+        period = 1.0 / max(self.source_fps, 1e-3)
+        next_t = time.time()
+        while self._alive(gen):
+            frame = self.source()
+            if frame is not None:
+                self._process_frame(frame)
+            next_t += period
+            time.sleep(max(0.0, next_t - time.time()))
+
+    def start_capture(self):
+        """Start the supervised capture+inference thread once."""
+        if self._running:
+            return
+        self._running = True
+        self._spawn_capture()
+        _watchdog.ensure()
+
+    def stop_capture(self):
+        """Stop background capture."""
+        self._running = False
+        self._state = "stopped"
+
+    def mjpeg_generator(self, tier: str | None = None):
+        """Yield multipart JPEG stream for <img src='/video_feed'>."""
+        view = self._open_view(tier)
+        try:
+            while True:
+                part = self._next_part(view)
+                if part is None:
+                    time.sleep(STREAM_POLL_S)
+                    continue
+                yield part
+        finally:
+            self._unsubscribe(view["tier"])
+
+    def _open_view(self, tier: str | None) -> dict:
+        """Subscribe one viewer to a tier; the returned state goes to _next_part()."""
+        tier = _preview_tier(tier)
+        self._subscribe(tier)
+        now = time.time()
+        return {"tier": tier, "last_no": None, "last_new": now, "last_note": now}
+
+    def _next_part(self, view: dict) -> bytes | None:
+        """
+        Next multipart chunk for a viewer: a new frame, a placeholder once a
+        second while the stream is stale, or None (nothing to send yet).
+        """
+        with self._lock:
+            item = self._preview.get(view["tier"])
+        now = time.time()
+        if item is None or item[0] == view["last_no"]:
+            idle = now - view["last_new"]
+            if idle >= STALL_AFTER_S and now - view["last_note"] >= 1.0:
+                view["last_note"] = now
+                state = self._state if self._running else "stopped"
+                return _multipart(_placeholder_jpeg([f"Lane {self.name}: no new frames", f"{state}, {idle:.0f}s"]))
+            return None
+        view["last_no"], frame = item
+        view["last_new"] = now
+        return _multipart(frame)
+
+    # -------------------------
+    # Preview encoding
+    # -------------------------
+    def _subscribe(self, tier: str):
+        with self._lock:
+            self._subscribers[tier] = self._subscribers.get(tier, 0) + 1
+
+    def _unsubscribe(self, tier: str):
+        with self._lock:
+            left = self._subscribers.get(tier, 0) - 1
+            if left > 0:
+                self._subscribers[tier] = left
+            else:
+                # nobody watching: stop encoding and drop the stale frame
+                self._subscribers.pop(tier, None)
+                self._preview.pop(tier, None)
+
+    def _watched_tiers(self) -> list:
+        with self._lock:
+            return [t for t, n in self._subscribers.items() if n > 0]
+
+    def _publish_preview(self, tier: str, jpeg: bytes):
+        with self._lock:
+            if tier not in self._subscribers:
+                return
+            self._frame_no += 1
+            self._preview[tier] = (self._frame_no, jpeg)
+        self._beat("preview")
+
+    def _wants_lores(self) -> bool:
+        """True when a watched, software-encoded tier can be served from the lores stream."""
+        return any(
+            PREVIEW_TIERS[t]["width"] <= PICAM_LORES_SIZE[0] and t not in self._hw_tiers
+            for t in self._watched_tiers()
+        )
+
+    def _encode_previews(self, frame, lores=None):
+        """Software JPEG encode for watched tiers, rate-capped and downscaled."""
+        import cv2
+        now = time.time()
+        for tier in self._watched_tiers():
+            if tier in self._hw_tiers:
+                continue
+            spec = PREVIEW_TIERS[tier]
+            if now - self._last_encode.get(tier, 0.0) < 1.0 / spec["fps"]:
+                continue
+            self._last_encode[tier] = now
+
+            src = lores if (lores is not None and spec["width"] <= lores.shape[1]) else frame
+            h, w = src.shape[:2]
+            if w > spec["width"]:
+                src = cv2.resize(src, (spec["width"], int(h * spec["width"] / w)), interpolation=cv2.INTER_AREA)
+            ok, jpg = cv2.imencode(".jpg", src, [int(cv2.IMWRITE_JPEG_QUALITY), spec["quality"]])
+            if ok:
+                self._publish_preview(tier, jpg.tobytes())
+            else:
+                print(f"[ERROR] Failed to encode frame to JPEG (lane {self.name}).")
+
+    def _sync_hw_preview(self, picam2, encoder):
+        """
+        Run the Pi's hardware MJPEG encoder on the lores stream while a tier that
+        fits it is watched; stop it when nobody is. Falls back to software on error.
+        """
+        if not PICAM_HW_MJPEG or self._hw_failed:
+            return None
+        hw_tier = next(
+            (t for t in self._watched_tiers() if PREVIEW_TIERS[t]["width"] <= PICAM_LORES_SIZE[0]),
+            None
+        )
+        if hw_tier is not None and encoder is None:
+            try:
+                encoder = MJPEGEncoder()
+                picam2.start_encoder(encoder, _PreviewOutput(self, hw_tier), name="lores")
+                self._hw_tiers = {hw_tier}
+            except Exception as e:
+                print(f"[WARN] Hardware MJPEG unavailable, using software encode: {e}")
+                self._hw_failed = True
+                self._hw_tiers = set()
+                return None
+        elif hw_tier is None and encoder is not None:
+            try:
+                picam2.stop_encoder()
+            except Exception:
+                pass
+            self._hw_tiers = set()
+            encoder = None
+        return encoder
+
+    # -------------------------
+    # Awaitable API (ASGI server)
+    # -------------------------
+    async def mjpeg_agenerator(self, tier: str | None = None):
+        """Async twin of mjpeg_generator(): a viewer costs a coroutine, not a thread."""
+        view = self._open_view(tier)
+        try:
+            while True:
+                part = self._next_part(view)
+                if part is None:
+                    await asyncio.sleep(STREAM_POLL_S)
+                    continue
+                yield part
+        finally:
+            self._unsubscribe(view["tier"])
+
+    def new_detection(self, after_seq: int) -> dict | None:
+        """detect_crop() record if its seq is past after_seq (the /start_sorting arm point)."""
+        res = self.detect_crop()
+        return res if res and res.get("seq", 0) > after_seq else None
+
+    def wait_for_detection_blocking(self, after_seq: int, timeout: float, poll_interval: float = 0.2):
+        """new_detection() polled until it returns a record, or None on timeout."""
+        end_time = time.time() + timeout
+        while time.time() < end_time:
+            res = self.new_detection(after_seq)
+            if res:
+                return res
+            time.sleep(poll_interval)
         return None
 
-    crop_type_raw = (res.get('crop_type') or '').lower()
-    color_raw = (res.get('color') or '').lower()
+    async def wait_for_detection(self, after_seq: int, timeout: float, poll_interval: float = 0.2):
+        """Async twin of wait_for_detection_blocking()."""
+        loop = asyncio.get_running_loop()
+        end_time = loop.time() + timeout
+        while loop.time() < end_time:
+            res = self.new_detection(after_seq)
+            if res:
+                return res
+            await asyncio.sleep(poll_interval)
+        return None
 
-    # Normalize crop type (trust model; fallback to dropdown)
-    if 'pepper' in crop_type_raw or 'bellpep' in crop_type_raw or 'bell pepper' in crop_type_raw:
-        crop_type = 'Bell Pepper'
-    elif 'tomato' in crop_type_raw:
-        crop_type = 'Tomato'
-    else:
-        crop_type = _current_crop.capitalize() if _current_crop else 'Unknown'
 
-    # Normalize color with safe defaults by crop
-    if 'red' in color_raw:
-        color = 'Red'
-    elif 'green' in color_raw:
-        color = 'Green'
-    else:
-        color = 'Red' if crop_type == 'Bell Pepper' else ('Green' if crop_type == 'Tomato' else '')
-
-    return {
-        'crop_type':     crop_type,
-        'condition':     res.get('condition', ''),
-        'color':         color,
-        'sorted_to':     res.get('sorted_to', ''),
-        'size':          res.get('size', ''),
-        'time_detected': res.get('time_detected', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-        'confidence':    float(res.get('confidence', 0.0)),
-        'seq':           int(res.get('seq', 0)),
-    }
+if _USE_PICAM:
+    class _PreviewOutput(Output):
+        """picamera2 Output that publishes hardware-encoded JPEGs into a lane's preview tier."""
+
+        def __init__(self, lane: CameraLane, tier: str):
+            super().__init__()
+            self._lane = lane
+            self._tier = tier
+            self._min_interval = 1.0 / PREVIEW_TIERS[tier]["fps"]
+            self._last = 0.0
+
+        def outputframe(self, frame, *args, **kwargs):
+            now = time.time()
+            if now - self._last < self._min_interval:
+                return
+            self._last = now
+            self._lane._publish_preview(self._tier, bytes(frame))
 
 
 # -------------------------
-# Internal helpers
+# Stateless helpers
 # -------------------------
+def _preview_tier(tier: str | None) -> str:
+    return tier if tier in PREVIEW_TIERS else DEFAULT_PREVIEW_TIER
+
+
+def _multipart(jpeg: bytes) -> bytes:
+    return b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+
+def _placeholder_jpeg(lines) -> bytes:
+    import cv2
+    img = np.full((240, 320, 3), 40, dtype=np.uint8)
+    for i, text in enumerate(lines):
+        cv2.putText(img, text, (12, 110 + 28 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (60, 60, 230), 1, cv2.LINE_AA)
+    ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 60])
+    return buf.tobytes() if ok else b""
+
+
 def _scene_stats(frame):
     import cv2
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
@@ -178,269 +1319,107 @@ def _scene_stats(frame):
     return gray, lap_var, std
 
 
-def _scene_has_object(frame) -> bool:
-    """Reject very flat/blank frames."""
-    try:
-        _, lap_var, std = _scene_stats(frame)
-        return lap_var > SCENE_LAP_VAR_MIN and std > SCENE_STD_MIN
-    except Exception:
-        # Fail-open so we don't block detection if stats fail for any reason
-        return True
-
-
-def _scene_changed_vs_baseline(frame) -> bool:
-    """Require a noticeable change vs. baseline snapshot taken at Start Sorting."""
-    try:
-        _, lap, std = _scene_stats(frame)
-        with _baseline_lock:
-            b_lap = _baseline["lap"]
-            b_std = _baseline["std"]
-        if b_lap is None or b_std is None:
-            return True  # no baseline -> don't block
-        return (abs(lap - b_lap) > BASELINE_LAP_DELTA_MIN) or (abs(std - b_std) > BASELINE_STD_DELTA_MIN)
-    except Exception:
-        return True
-
-
-def _snapshot_scene(frame):
-    """Capture baseline scene stats at arming time."""
-    try:
-        import cv2
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        lap_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-        std = float(gray.std())
-        with _baseline_lock:
-            _baseline["lap"] = float(lap_var)
-            _baseline["std"] = std
-    except Exception:
-        with _baseline_lock:
-            _baseline["lap"] = None
-            _baseline["std"] = None
-
-
-def _update_motion_and_baseline(frame):
-    """Update motion score and snapshot baseline on the first armed frame."""
-    global _prev_gray, _motion_score, _motion_after_armed
-    try:
-        import cv2
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        if _prev_gray is None:
-            _prev_gray = gray
-            # On first frame after Start Sorting, snapshot baseline
-            if _armed:
-                _snapshot_scene(frame)
-            return
-        diff = cv2.absdiff(gray, _prev_gray)
-        _prev_gray = gray
-        score = float(diff.mean())  # simple, robust motion metric
-        with _motion_lock:
-            _motion_score = score
-            if _armed and score > MOTION_SCORE_THRESHOLD:
-                _motion_after_armed = True
-    except Exception:
-        pass
-
-
-def _classes_equal(a: dict, b: dict) -> bool:
-    """Check if two prediction dicts have same canonical class fields."""
-    return (
-        (a.get("crop_type") == b.get("crop_type")) and
-        (a.get("condition") == b.get("condition")) and
-        (a.get("color") == b.get("color"))
-    )
+# -------------------------
+# Lane registry
+# -------------------------
+_lanes = {}
+_lanes_lock = Lock()
 
 
-def _accept_or_reset(pred: dict, frame) -> dict:
-    """
-    Combine:
-      - model confidence gate (handled in model_inference)
-      - scene gate (edges/contrast)
-      - scene change vs baseline
-      - motion gate (must see motion after arming)
-      - class stability (N identical classes in a row)
-      - debounce (N consecutive frames)
-    Returns either a full payload (present=True) or {present: False}.
-    """
-    global _present_streak, _seq, _armed, _class_window
-
-    conf = float(pred.get("confidence", 0.0))
-    model_present = bool(pred.get("present", False))
-    scene_ok = _scene_has_object(frame)
-    scene_changed = _scene_changed_vs_baseline(frame)
-    _update_motion_and_baseline(frame)
-    with _motion_lock:
-        motion_ok = bool(_motion_after_armed)
-
-    # FIRST detection after Start Sorting must be extra confident
-    if _armed and conf < ARMED_FIRST_MIN_CONF:
-        model_present = False
-
-    # Basic gates
-    if not (model_present and scene_ok and scene_changed and motion_ok):
-        _present_streak = 0
-        _class_window.clear()
-        return {"present": False, "seq": latest_result.get("seq", 0), "confidence": conf}
-
-    # Class stability window
-    norm_class = {
-        "crop_type": pred.get("crop_type", ""),
-        "condition": pred.get("condition", ""),
-        "color": pred.get("color", ""),
-    }
-    _class_window.append(norm_class)
-    if len(_class_window) > CLASS_STABILITY:
-        _class_window.pop(0)
+def add_lane(name: str | None = None, index=0, source=None) -> CameraLane:
+    """Register (or return the existing) lane for a camera index / Picamera number."""
+    name = str(index) if name is None else str(name)
+    with _lanes_lock:
+        lane = _lanes.get(name)
+        if lane is None:
+            lane = CameraLane(name, index, source=source)
+            _lanes[name] = lane
+        return lane
 
-    stable = (len(_class_window) == CLASS_STABILITY) and all(
-        _classes_equal(_class_window[0], c) for c in _class_window
-    )
-    if not stable:
-        return {"present": False, "seq": latest_result.get("seq", 0), "confidence": conf}
-
-    # Passed stability; count toward streak
-    _present_streak += 1
-    if _present_streak < MIN_PRESENT_STREAK:
-        return {"present": False, "seq": latest_result.get("seq", 0), "confidence": conf}
-
-    # Accept new detection (brand-new seq)
-    _seq += 1
-    payload = {
-        "present":       True,
-        "seq":           _seq,
-        "crop_type":     pred.get("crop_type", _current_crop),
-        "condition":     pred.get("condition", ""),
-        "color":         pred.get("color", ""),
-        "sorted_to":     pred.get("sorted_to", ""),
-        "size":          pred.get("size", ""),
-        "time_detected": pred.get("time_detected") or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "confidence":    conf,
-    }
-    # consume this detection once
-    _present_streak = 0
-    _class_window.clear()
-    _armed = False  # leave armed-mode on first accepted detection
-    return payload
 
+def get_lane(name: str | None = None) -> CameraLane | None:
+    """Look up a lane by name; the default lane is created on first use."""
+    if name is None or str(name) == DEFAULT_LANE:
+        return add_lane(DEFAULT_LANE, 0)
+    with _lanes_lock:
+        return _lanes.get(str(name))
+
+
+def list_lanes() -> list:
+    with _lanes_lock:
+        return list(_lanes.values())
+
+
+def _running_lane_count() -> int:
+    with _lanes_lock:
+        return sum(1 for lane in _lanes.values() if lane.running)
+
+
+class _Watchdog:
+    """One thread that checks every lane's capture heartbeat (see CameraLane._check_stall)."""
+
+    def __init__(self):
+        self._thread = None
+        self._start_lock = Lock()
+
+    def ensure(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name="capture-watchdog", daemon=True)
+                self._thread.start()
 
-def _update_latest(res: dict):
-    """Atomically replace the shared latest_result dict."""
-    with _result_lock:
-        latest_result.clear()
-        latest_result.update(res)
+    def _run(self):
+        while True:
+            time.sleep(WATCHDOG_INTERVAL_S)
+            for lane in list_lanes():
+                try:
+                    lane._check_stall()
+                except Exception as e:
+                    print(f"[ERROR] Watchdog (lane {lane.name}): {type(e).__name__}: {e}")
+
+
+_watchdog = _Watchdog()
 
 
 # -------------------------
-# Capture loops
+# Module-level API (default lane unless one is named)
 # -------------------------
-def _picam_loop():
-    import cv2
-    global _latest, _last_infer_time
-
-    picam2 = Picamera2()
-    cfg = picam2.create_preview_configuration(
-        main={"size": (640, 480), "format": "RGB888"},
-        buffer_count=4
-    )
-    picam2.configure(cfg)
-    picam2.set_controls({
-        "AfMode": controls.AfModeEnum.Continuous,
-        "AwbEnable": True,
-        "AeEnable": True,
-        "AwbMode": 1
-    })
-    picam2.start()
-    try:
-        while _running:
-            frame = picam2.capture_array()  # RGB888
-
-            # Inference every ~0.5s
-            now = time.time()
-            if now - _last_infer_time > 0.5:
-                pred = predict(frame)                  # model-level gate (confidence)
-                gated = _accept_or_reset(pred, frame)  # all gates + stability + debounce
-                _update_latest(gated)
-                _last_infer_time = now
+def set_current_crop(name: str, lane: str | None = None):
+    """Allow UI/API to set currently targeted crop to improve defaults."""
+    get_lane(lane).set_current_crop(name)
 
-            ok, jpg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-            if ok:
-                with _lock:
-                    _latest = jpg.tobytes()
-            time.sleep(0.01)
-    finally:
-        picam2.stop()
 
+def get_latest_result(lane: str | None = None) -> dict:
+    """Thread-safe copy of the latest inference payload for a lane."""
+    return get_lane(lane).get_latest_result()
 
-def _opencv_loop(index=0):
-    import cv2
-    global _latest, _last_infer_time
-
-    cap = cv2.VideoCapture(index)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    cap.set(cv2.CAP_PROP_FPS, 15)
-
-    if not cap.isOpened():
-        print(f"[ERROR] Camera at index {index} could not be opened.")
-        return
-
-    try:
-        while _running:
-            ok, frame = cap.read()
-            if not ok:
-                print("[ERROR] Failed to read frame from camera.")
-                time.sleep(0.05)
-                continue
 
-            # Snapshot baseline right after arming (first available frame)
-            if _armed and (_baseline["std"] is None or _baseline["lap"] is None):
-                _snapshot_scene(frame)
+def mark_sorting_start(lane: str | None = None) -> int:
+    """Arm a lane for a fresh detection. Returns the current seq token."""
+    return get_lane(lane).mark_sorting_start()
 
-            # Inference every ~0.5s
-            now = time.time()
-            if now - _last_infer_time > 0.5:
-                pred = predict(frame)
-                gated = _accept_or_reset(pred, frame)
-                _update_latest(gated)
-                _last_infer_time = now
 
-            ok, jpg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 70])
-            if ok:
-                with _lock:
-                    _latest = jpg.tobytes()
-            else:
-                print("[ERROR] Failed to encode frame to JPEG.")
-            time.sleep(0.01)
-    finally:
-        cap.release()
+def detect_crop(lane: str | None = None) -> dict | None:
+    """UI/DB-ready record for a lane, or None when nothing is present."""
+    return get_lane(lane).detect_crop()
 
 
-def start_capture(index=0):
-    """Start background capture+inference thread once."""
-    global _running
-    if _running:
-        return
-    _running = True
-    Thread(
-        target=(_picam_loop if _USE_PICAM else _opencv_loop),
-        args=(() if _USE_PICAM else (index,)),
-        daemon=True
-    ).start()
+def start_capture(index=0, lane: str | None = None):
+    """Start background capture+inference for a camera index (once per lane)."""
+    add_lane(lane, index).start_capture()
 
 
-def stop_capture():
-    """Stop background capture."""
-    global _running
-    _running = False
+def stop_capture(lane: str | None = None):
+    """Stop background capture for one lane, or every lane when none is named."""
+    if lane is None:
+        for l in list_lanes():
+            l.stop_capture()
+    else:
+        target = get_lane(lane)
+        if target is not None:
+            target.stop_capture()
 
 
-def mjpeg_generator():
+def mjpeg_generator(lane: str | None = None, tier: str | None = None):
     """Yield multipart JPEG stream for <img src='/video_feed'>."""
-    boundary = b"--frame"
-    while True:
-        with _lock:
-            frame = _latest
-        if frame is None:
-            time.sleep(0.05)
-            continue
-        yield boundary + b"\r\nContent-Type: image/jpeg\r\n\r\n" + frame + b"\r\n"
-        time.sleep(0.01)
+    return get_lane(lane).mjpeg_generator(tier)
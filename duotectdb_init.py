@@ -1,5 +1,91 @@
 import sqlite3
 
+# Detection storage: tbl_detection keeps one small row per detection with
+# integer codes from tbl_dim and an epoch-seconds timestamp; tbl_sorting is a
+# view that decodes it back to the original text columns and
+# '%Y-%m-%d %H:%M:%S' local time, so existing queries and JSON stay the same.
+DETECTION_TABLE = 'tbl_detection'
+DIM_COLUMNS = ('crop_type', 'condition', 'color', 'sorted_to', 'size', 'lane')
+
+def _is_table(c, name):
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    return c.fetchone() is not None
+
+def create_detection_schema(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS tbl_dim (
+            id INTEGER PRIMARY KEY,
+            dim TEXT NOT NULL,
+            value TEXT NOT NULL,
+            UNIQUE (dim, value)
+        )
+    ''')
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS {DETECTION_TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            {", ".join(f"{d}_id INTEGER" for d in DIM_COLUMNS)},
+            seq INTEGER
+        )
+    ''')
+    c.execute(f'CREATE INDEX IF NOT EXISTS idx_detection_ts ON {DETECTION_TABLE} (ts)')
+    c.execute(f'CREATE INDEX IF NOT EXISTS idx_detection_seq ON {DETECTION_TABLE} (seq)')
+
+    joins = "\n".join(f"LEFT JOIN tbl_dim {d}_v ON {d}_v.id = d.{d}_id" for d in DIM_COLUMNS)
+    c.execute(f'''
+        CREATE VIEW IF NOT EXISTS tbl_sorting AS
+        SELECT d.id AS id,
+               crop_type_v.value AS crop_type, condition_v.value AS condition, color_v.value AS color,
+               sorted_to_v.value AS sorted_to, size_v.value AS size,
+               datetime(d.ts, 'unixepoch', 'localtime') AS time_detected,
+               d.seq AS seq, lane_v.value AS lane, d.ts AS ts
+        FROM {DETECTION_TABLE} d
+        {joins}
+    ''')
+
+    # Writes through the view: add unseen values to tbl_dim, then store codes.
+    # Triggers are recreated every time so existing databases get fixes.
+    upserts = "\n".join(
+        f"INSERT OR IGNORE INTO tbl_dim (dim, value) SELECT '{d}', NEW.{d} WHERE NEW.{d} IS NOT NULL;"
+        for d in DIM_COLUMNS
+    )
+    codes = ", ".join(f"(SELECT id FROM tbl_dim WHERE dim = '{d}' AND value = NEW.{d})" for d in DIM_COLUMNS)
+    code_cols = ", ".join(f"{d}_id" for d in DIM_COLUMNS)
+    # time_detected SQLite cannot parse falls back to the insert time instead of failing NOT NULL
+    new_ts = ("COALESCE(NEW.ts, CAST(strftime('%s', NEW.time_detected, 'utc') AS INTEGER), "
+              "CAST(strftime('%s', 'now') AS INTEGER))")
+    for name in ('tbl_sorting_insert', 'tbl_sorting_update', 'tbl_sorting_delete'):
+        c.execute(f'DROP TRIGGER IF EXISTS {name}')
+    c.execute(f'''
+        CREATE TRIGGER tbl_sorting_insert INSTEAD OF INSERT ON tbl_sorting
+        BEGIN
+            {upserts}
+            INSERT INTO {DETECTION_TABLE} (id, ts, {code_cols}, seq)
+            VALUES (NEW.id, {new_ts}, {codes}, NEW.seq);
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER tbl_sorting_update INSTEAD OF UPDATE ON tbl_sorting
+        BEGIN
+            {upserts}
+            UPDATE {DETECTION_TABLE} SET
+                id = NEW.id,
+                ts = CASE WHEN NEW.ts IS NOT OLD.ts THEN NEW.ts
+                          WHEN NEW.time_detected IS NOT OLD.time_detected
+                               THEN COALESCE(CAST(strftime('%s', NEW.time_detected, 'utc') AS INTEGER), OLD.ts)
+                          ELSE OLD.ts END,
+                ({code_cols}) = ({codes}),
+                seq = NEW.seq
+            WHERE id = OLD.id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER tbl_sorting_delete INSTEAD OF DELETE ON tbl_sorting
+        BEGIN
+            DELETE FROM {DETECTION_TABLE} WHERE id = OLD.id;
+        END
+    ''')
+
 def create_tables(db_path):
     conn = sqlite3.connect(db_path)
     c = conn.cursor()
@@ -20,18 +106,10 @@ def create_tables(db_path):
         )
     ''')
 
-    # Create tbl_sorting
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS tbl_sorting (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            crop_type TEXT,
-            condition TEXT,
-            color TEXT,
-            sorted_to TEXT,
-            size TEXT,
-            time_detected TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
+    # Create tbl_sorting (integer-coded storage behind a view; an older
+    # plain tbl_sorting table is converted by migrate_sorting_storage)
+    if not _is_table(c, 'tbl_sorting'):
+        create_detection_schema(c)
 
     # Create tbl_activity_log
     c.execute('''
@@ -49,6 +127,59 @@ def create_tables(db_path):
     conn.commit()
     conn.close()
 
+# Columns the app writes that older databases may lack
+APP_COLUMNS = {
+    'tbl_sorting': (('seq', 'INTEGER'), ('lane', 'TEXT')),
+    'tbl_users': (('role', 'TEXT'), ('baranggay', 'TEXT')),
+}
+
+def add_missing_columns(db_path):
+    """Bring an older database up to date with the columns app_signup uses."""
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    for table, columns in APP_COLUMNS.items():
+        c.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in c.fetchall()}
+        for column, decl in columns:
+            if column not in existing:
+                c.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+    conn.commit()
+    conn.close()
+
+def migrate_sorting_storage(db_path):
+    """Move rows from an old text-column tbl_sorting table into the coded schema."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    c = conn.cursor()
+    # Several server processes may start at once; only the first one migrates
+    c.execute('BEGIN IMMEDIATE')
+    if not _is_table(c, 'tbl_sorting'):
+        conn.rollback()
+        conn.close()
+        return 0
+    c.execute('ALTER TABLE tbl_sorting RENAME TO tbl_sorting_legacy')
+    create_detection_schema(c)
+    c.execute('''
+        INSERT INTO tbl_sorting (id, crop_type, condition, color, sorted_to, size, time_detected, seq, lane)
+        SELECT id, crop_type, condition, color, sorted_to, size, time_detected, seq, lane
+        FROM tbl_sorting_legacy ORDER BY id
+    ''')
+    c.execute(f'SELECT COUNT(*) FROM {DETECTION_TABLE}')
+    moved = c.fetchone()[0]
+    c.execute('DROP TABLE tbl_sorting_legacy')
+    conn.commit()
+    conn.execute('VACUUM')  # hand the freed text pages back to the SD card
+    conn.close()
+    return moved
+
+def init_db(db_path):
+    """Create, update and migrate the schema; safe to run at every startup."""
+    create_tables(db_path)
+    add_missing_columns(db_path)
+    moved = migrate_sorting_storage(db_path)
+    if moved:
+        print(f"Moved {moved} tbl_sorting rows to {DETECTION_TABLE}.")
+    return moved
+
 if __name__ == "__main__":
-    create_tables("duotectdb.sqlite3")
+    init_db("duotectdb.sqlite3")
     print("Tables created successfylly in duotectdb.sqlite3.")
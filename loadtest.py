@@ -0,0 +1,405 @@
+# loadtest.py
+#
+# Reproducible load test for the web tier. Boots app_signup in-process on a
+# temp SQLite DB with a synthetic camera lane, drives the traffic the pages
+# generate (sorting.html polling + start_sorting, history loads, MJPEG
+# viewers) and reports throughput, tail latency, server thread count and the
+# inference rate under load vs. idle.
+#
+#   python loadtest.py --dashboards 10 --viewers 5 --history 2 --duration 60 --save baseline.json
+#   python loadtest.py ... --compare baseline.json      (flag regressions vs. a saved run)
+#   python loadtest.py --target http://pi.local:8000 ... (external server, e.g. asgi.py)
+import argparse
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# sorting.html timings
+POLL_INTERVAL_S    = 1.2   # /get_latest_detection + /get_latest_sorting
+TRIGGER_INTERVAL_S = 3.0   # /start_sorting
+HISTORY_INTERVAL_S = 10.0  # history.html reload cadence used for "history" clients
+REGRESSION_PCT     = 20.0  # --compare: flag p95 / throughput changes worse than this
+CLIENT_THREAD      = "loadclient"  # name prefix of client threads (excluded from server count)
+
+TEST_USER = {
+    'first_name': 'Load', 'middle_name': '', 'last_name': 'Test',
+    'mobile_number': '09000000000', 'baranggay': 'Test', 'street': '', 'city': '',
+    'zip_code': '', 'password': 'loadtest', 'role': 'Sorter'
+}
+
+
+# --------------------------------------------------
+# Fake camera
+# --------------------------------------------------
+class SyntheticCamera:
+    """
+    640x480 textured belt with a red/green blob crossing the frame every few
+    seconds, so the motion/scene gates see objects arrive and leave.
+    """
+
+    def __init__(self, width=640, height=480, period_s=4.0, seed=0):
+        import cv2
+        self._cv2 = cv2
+        rng = np.random.default_rng(seed)
+        self.width, self.height, self.period_s = width, height, period_s
+        noise = rng.integers(60, 110, size=(height, width, 1), dtype=np.uint8)
+        self._belt = np.repeat(noise, 3, axis=2)
+        self._t0 = time.time()
+
+    def __call__(self):
+        phase = ((time.time() - self._t0) % self.period_s) / self.period_s
+        frame = self._belt.copy()
+        if phase < 0.6:  # object on the belt for 60% of each period
+            x = int(-60 + phase / 0.6 * (self.width + 120))
+            lap = int((time.time() - self._t0) // self.period_s)
+            color = (40, 40, 200) if lap % 2 == 0 else (40, 180, 40)
+            self._cv2.ellipse(frame, (x, self.height // 2), (60, 50), 0, 0, 360, color, -1)
+        return frame
+
+
+# --------------------------------------------------
+# In-process server
+# --------------------------------------------------
+def _prepare_db(path):
+    from duotectdb_init import create_tables, add_missing_columns
+    create_tables(path)
+    add_missing_columns(path)
+
+
+def start_local_server(port, source_fps):
+    """Run app_signup (threaded dev server, as in production today) on a temp DB."""
+    from werkzeug.serving import make_server
+    import app_signup
+    import camera
+    import snapshot_archive
+    import auth
+
+    tmpdir = tempfile.mkdtemp(prefix="duotectiq-load-")
+    db_path = os.path.join(tmpdir, "load.sqlite3")
+    _prepare_db(db_path)
+    app_signup.DB_PATH = db_path
+    snapshot_archive.archive.db_path = db_path
+    snapshot_archive.archive.root = Path(tmpdir) / "snapshots"
+    auth.sessions.db_path = db_path
+    app_signup.insert_user(TEST_USER)
+
+    lane = camera.add_lane(camera.DEFAULT_LANE, source=SyntheticCamera())
+    lane.source_fps = source_fps
+    lane.start_capture()
+
+    server = make_server("127.0.0.1", port, app_signup.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="loadtest-server", daemon=True).start()
+
+    def shutdown():
+        server.shutdown()
+        lane.stop_capture()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return f"http://127.0.0.1:{port}", shutdown
+
+
+# --------------------------------------------------
+# Clients
+# --------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}   # endpoint -> [seconds]
+        self.errors = {}      # endpoint -> count
+        self.mjpeg = []       # per viewer: (frames, bytes, seconds)
+
+    def add(self, endpoint, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+class _Client:
+    """One keep-alive HTTP connection, like a browser tab."""
+
+    def __init__(self, base_url, rec, timeout=20.0):
+        u = urlsplit(base_url)
+        self.host, self.port = u.hostname, u.port or 80
+        self.rec = rec
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, label=None, token=None, expect=()):
+        """Time one request; any 4xx/5xx not listed in `expect` counts as an error."""
+        label = label or f"{method} {path.split('?')[0]}"
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        data = json.dumps(body).encode() if body is not None else None
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.conn.request(method, path, body=data, headers=headers)
+            resp = self.conn.getresponse()
+            resp.read()
+            ok = resp.status < 400 or resp.status in expect
+        except (OSError, http.client.HTTPException):
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+        self.rec.add(label, time.perf_counter() - t0, ok)
+
+
+def login(base_url):
+    """Session token for TEST_USER (None if the server rejects it)."""
+    u = urlsplit(base_url)
+    body = {"mobile_number": TEST_USER['mobile_number'], "password": TEST_USER['password']}
+    try:
+        conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=10)
+        conn.request("POST", "/login", body=json.dumps(body).encode(),
+                     headers={"Content-Type": "application/json"})
+        token = json.loads(conn.getresponse().read()).get("token")
+        conn.close()
+    except (OSError, ValueError, http.client.HTTPException):
+        return None
+    return token
+
+
+def dashboard_client(base_url, rec, stop, token=None, threads=None):
+    """sorting.html after pressing Start: profile once, then poll + trigger."""
+    c = _Client(base_url, rec)
+    trigger = _Client(base_url, rec)  # start_sorting blocks, the page fires it concurrently
+    c.request("POST", "/profile", token=token)
+
+    def trigger_loop():
+        while not stop.is_set():
+            trigger.request("POST", "/start_sorting", {"crop_type": "tomato"})
+            stop.wait(TRIGGER_INTERVAL_S)
+
+    t = threading.Thread(target=trigger_loop, name=f"{CLIENT_THREAD}-trigger", daemon=True)
+    if threads is not None:
+        threads.append(t)  # joined with the other clients so in-flight triggers are counted
+    t.start()
+    while not stop.is_set():
+        c.request("GET", "/get_latest_detection")
+        c.request("GET", "/get_latest_sorting", expect=(404,))  # 404 until something is saved
+        stop.wait(POLL_INTERVAL_S)
+
+
+def history_client(base_url, rec, stop, token=None):
+    c = _Client(base_url, rec)
+    while not stop.is_set():
+        c.request("POST", "/profile", token=token)
+        c.request("GET", "/get_activity_log")
+        stop.wait(HISTORY_INTERVAL_S)
+
+
+def mjpeg_client(base_url, rec, stop, tier=None):
+    u = urlsplit(base_url)
+    path = "/video_feed" + (f"?tier={tier}" if tier else "")
+    frames = nbytes = 0
+    t0 = time.time()
+    try:
+        conn = http.client.HTTPConnection(u.hostname, u.port or 80, timeout=10)
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        while not stop.is_set():
+            chunk = resp.read1(65536) if hasattr(resp, "read1") else resp.read(65536)
+            if not chunk:
+                break
+            nbytes += len(chunk)
+            frames += chunk.count(b"--frame")
+        conn.close()
+    except (OSError, http.client.HTTPException):
+        rec.add("GET /video_feed", time.time() - t0, False)
+    with rec._lock:
+        rec.mjpeg.append((frames, nbytes, time.time() - t0))
+
+
+# --------------------------------------------------
+# Measurement
+# --------------------------------------------------
+def _lane_counters(base_url):
+    c = _Client(base_url, Recorder())
+    try:
+        c.conn = http.client.HTTPConnection(c.host, c.port, timeout=5)
+        c.conn.request("GET", "/lanes")
+        lanes = json.loads(c.conn.getresponse().read()).get("lanes", [])
+    except (OSError, ValueError, http.client.HTTPException):
+        return None
+    return sum(l.get("inference_count", 0) for l in lanes)
+
+
+def _inference_rate(base_url, seconds):
+    start = _lane_counters(base_url)
+    time.sleep(seconds)
+    end = _lane_counters(base_url)
+    if start is None or end is None:
+        return None
+    return (end - start) / seconds
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    return float(np.percentile(np.asarray(values) * 1000.0, pct))
+
+
+def summarize(rec, duration, idle_rate, load_rate, peak_threads):
+    endpoints = {}
+    total = 0
+    for name, lat in sorted(rec.latencies.items()):
+        total += len(lat)
+        endpoints[name] = {
+            "requests": len(lat),
+            "errors": rec.errors.get(name, 0),
+            "rps": round(len(lat) / duration, 2),
+            "p50_ms": _percentile(lat, 50),
+            "p95_ms": _percentile(lat, 95),
+            "p99_ms": _percentile(lat, 99),
+            "max_ms": _percentile(lat, 100),
+        }
+    viewers = [
+        {"fps": round(f / s, 2) if s else 0.0, "kbps": round(b * 8 / 1000 / s, 1) if s else 0.0}
+        for f, b, s in rec.mjpeg
+    ]
+    return {
+        "duration_s": duration,
+        "total_rps": round(total / duration, 2),
+        "endpoints": endpoints,
+        "mjpeg_viewers": viewers,
+        "peak_server_threads": peak_threads,
+        "inference_rate_idle": idle_rate,
+        "inference_rate_load": load_rate,
+    }
+
+
+def print_report(report):
+    print(f"\nDuration {report['duration_s']}s, total {report['total_rps']} req/s")
+    print(f"{'endpoint':32} {'req':>6} {'err':>5} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, e in report["endpoints"].items():
+        fmt = lambda v: f"{v:8.1f}" if v is not None else "       -"
+        print(f"{name:32} {e['requests']:>6} {e['errors']:>5} {e['rps']:>7} "
+              f"{fmt(e['p50_ms'])} {fmt(e['p95_ms'])} {fmt(e['p99_ms'])} {fmt(e['max_ms'])}")
+    if report["mjpeg_viewers"]:
+        fps = [v["fps"] for v in report["mjpeg_viewers"]]
+        print(f"MJPEG viewers: {len(fps)}, fps min/avg {min(fps):.1f}/{sum(fps) / len(fps):.1f}")
+    if report["peak_server_threads"] is not None:
+        print(f"Peak threads in server process: {report['peak_server_threads']}")
+    print(f"Inference rate idle/load: {report['inference_rate_idle']} / {report['inference_rate_load']} per s")
+
+
+def compare(report, baseline, pct=REGRESSION_PCT):
+    """Return human-readable regressions of `report` against `baseline`."""
+    issues = []
+    for name, cur in report["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if not old:
+            continue
+        if old.get("p95_ms") and cur.get("p95_ms") and cur["p95_ms"] > old["p95_ms"] * (1 + pct / 100):
+            issues.append(f"{name}: p95 {old['p95_ms']:.1f} -> {cur['p95_ms']:.1f} ms")
+        if cur["errors"] > old.get("errors", 0):
+            issues.append(f"{name}: errors {old.get('errors', 0)} -> {cur['errors']}")
+    old_rate, new_rate = baseline.get("inference_rate_load"), report.get("inference_rate_load")
+    if old_rate and new_rate is not None and new_rate < old_rate * (1 - pct / 100):
+        issues.append(f"inference rate under load {old_rate:.2f} -> {new_rate:.2f} /s")
+    return issues
+
+
+# --------------------------------------------------
+# Main
+# --------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the DUOTECTIQ web tier.")
+    parser.add_argument("--target", help="base URL of a running server (default: start one in-process)")
+    parser.add_argument("--port", type=int, default=8765, help="port for the in-process server")
+    parser.add_argument("--dashboards", type=int, default=5, help="sorting.html clients")
+    parser.add_argument("--history", type=int, default=2, help="history.html clients")
+    parser.add_argument("--viewers", type=int, default=3, help="MJPEG /video_feed consumers")
+    parser.add_argument("--tier", default=None, help="preview tier for viewers (low/medium/high)")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--idle", type=float, default=5.0, help="seconds to measure idle inference rate")
+    parser.add_argument("--camera-fps", type=float, default=15.0)
+    parser.add_argument("--save", help="write the JSON report here (e.g. a baseline)")
+    parser.add_argument("--compare", help="baseline JSON to compare against; exit 1 on regression")
+    args = parser.parse_args(argv)
+
+    shutdown = None
+    if args.target:
+        base_url = args.target.rstrip("/")
+    else:
+        base_url, shutdown = start_local_server(args.port, args.camera_fps)
+        time.sleep(1.0)  # let the first frames through
+
+    try:
+        idle_rate = _inference_rate(base_url, args.idle) if args.idle > 0 else None
+        token = login(base_url)
+        if token is None:
+            print(f"[WARN] Could not log in as {TEST_USER['mobile_number']}; /profile requests will fail")
+
+        rec = Recorder()
+        stop = threading.Event()
+        workers = []
+        triggers = []  # /start_sorting threads started by the dashboard clients
+        for kind, target, count, extra in (
+            ("dashboard", dashboard_client, args.dashboards, (token, triggers)),
+            ("history", history_client, args.history, (token,)),
+            ("mjpeg", mjpeg_client, args.viewers, (args.tier,)),
+        ):
+            for i in range(count):
+                workers.append(threading.Thread(
+                    target=target, args=(base_url, rec, stop) + extra,
+                    name=f"{CLIENT_THREAD}-{kind}-{i}", daemon=True
+                ))
+        for w in workers:
+            w.start()
+
+        start_count = _lane_counters(base_url)
+        peak = 0
+        t_end = time.time() + args.duration
+        while time.time() < t_end:
+            # client threads live in this process too, so count them out
+            server_threads = sum(1 for t in threading.enumerate() if not t.name.startswith(CLIENT_THREAD))
+            peak = max(peak, server_threads)
+            time.sleep(0.5)
+        end_count = _lane_counters(base_url)
+        stop.set()
+        for w in workers:
+            w.join(timeout=15)
+        for t in list(triggers):
+            t.join(timeout=15)  # /start_sorting waits up to 12 s for a detection
+
+        load_rate = None
+        if start_count is not None and end_count is not None:
+            load_rate = round((end_count - start_count) / args.duration, 3)
+        if idle_rate is not None:
+            idle_rate = round(idle_rate, 3)
+        report = summarize(rec, args.duration, idle_rate, load_rate, None if args.target else peak)
+    finally:
+        if shutdown:
+            shutdown()
+
+    print_report(report)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            issues = compare(report, json.load(f))
+        if issues:
+            print("\nREGRESSIONS vs baseline:")
+            for line in issues:
+                print("  " + line)
+            raise SystemExit(1)
+        print("\nNo regressions vs baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,12 @@
 import onnxruntime as ort
 import numpy as np
 import cv2
+import itertools
 import json
+import time
 from pathlib import Path
 from datetime import datetime
+from threading import Thread, Lock
 
 # ---------------------------
 # CONFIG
@@ -14,36 +17,240 @@ MODEL_PATH    = ARTIFACTS_DIR / "resnet18_duotectiq.onnx"
 CLASSES_PATH  = ARTIFACTS_DIR / "class_names.json"
 PREPROC_PATH  = ARTIFACTS_DIR / "preprocess.json"
 
+WARMUP_BATCH  = 2      # frames pushed through a freshly loaded session before it goes live
+WATCH_INTERVAL_S = 2.0 # artifact mtime polling period for the file watcher
+
+# Multi-view (test-time) inference: several square views per frame run in the
+# same session.run and their softmax outputs are averaged.
+#   "full"      whole frame squashed to img_size (the single-view default)
+#   "letterbox" whole frame, aspect kept, padded with the mean colour
+#   "center"    centre square crop
+#   "left"/"right" end square crops along the long side (top/bottom if portrait)
+SINGLE_VIEW            = ("full",)
+TTA_ENABLED            = False
+TTA_VIEWS              = ("full", "letterbox", "left", "right")
+TTA_LATENCY_BUDGET_MS  = 300.0  # multi-view predict_batch slower than this -> single view
+TTA_RETRY_S            = 30.0   # then try multi-view again after this long
+
+# predict()/predict_batch() fall back to "no crop" on errors; this keeps
+# them visible (/system-status).
+predict_health = {"errors": 0, "last_error": None, "last_error_at": None}
+
 # ---------------------------
-# LOAD ARTIFACTS
+# MODEL REGISTRY
 # ---------------------------
-with open(CLASSES_PATH, "r") as f:
-    CLASS_NAMES = json.load(f)
+class ModelBundle:
+    """
+    Session + class names + preprocessing constants, loaded and swapped as one
+    unit so an inference never mixes a new model with old class names.
+    Results carry the bundle's version so later labelling can find it again.
+    """
+
+    _versions = itertools.count(1)
+
+    def __init__(self, model_path=MODEL_PATH, classes_path=CLASSES_PATH, preproc_path=PREPROC_PATH):
+        self.model_path = Path(model_path)
+        self.classes_path = Path(classes_path)
+        self.preproc_path = Path(preproc_path)
+
+        with open(self.classes_path, "r") as f:
+            self.class_names = json.load(f)
+
+        with open(self.preproc_path, "r") as f:
+            self.preproc = json.load(f)
+
+        self.img_size = self.preproc.get("img_size", 224)
+        self.mean = np.array(self.preproc.get("mean", [0.485, 0.456, 0.406]), dtype=np.float32)
+        self.std  = np.array(self.preproc.get("std",  [0.229, 0.224, 0.225]), dtype=np.float32)
+
+        self.session = ort.InferenceSession(str(self.model_path), providers=["CPUExecutionProvider"])
+        self.input_meta = self.session.get_inputs()[0]
+        self.loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.version = next(self._versions)
+
+    def artifact_mtimes(self):
+        return tuple(_mtime(p) for p in (self.model_path, self.classes_path, self.preproc_path))
+
+    def warm_up(self, batch_size=WARMUP_BATCH):
+        """Run a dummy batch and check the output matches the class list."""
+        dummy = np.zeros((self.img_size, self.img_size, 3), dtype=np.uint8)
+        batch = np.concatenate([preprocess(dummy, self) for _ in range(batch_size)], axis=0)
+        logits = _run_logits(batch, self)
+        if logits.shape != (batch_size, len(self.class_names)):
+            raise ValueError(
+                f"model output {tuple(logits.shape)} does not match "
+                f"{len(self.class_names)} classes in {self.classes_path.name}"
+            )
+
+    def describe(self):
+        return {
+            "model_path": str(self.model_path),
+            "classes": list(self.class_names),
+            "img_size": self.img_size,
+            "loaded_at": self.loaded_at,
+            "version": self.version,
+        }
+
+
+def artifact_path(path) -> Path:
+    """Resolve a file name/path for reload(); anything outside ARTIFACTS_DIR is rejected."""
+    root = ARTIFACTS_DIR.resolve()
+    resolved = (root / path).resolve()   # relative names are taken from artifacts/
+    if root not in resolved.parents:
+        raise ValueError(f"{path} is not inside {ARTIFACTS_DIR.name}/")
+    if not resolved.is_file():
+        raise ValueError(f"{path} does not exist")
+    return resolved
+
+def _mtime(path):
+    try:
+        return Path(path).stat().st_mtime
+    except OSError:
+        return None
+
+
+class ModelRegistry:
+    """
+    Holds the live ModelBundle. reload() builds and warms a new bundle on a
+    background thread and only then swaps the reference, so the capture loop
+    keeps classifying with the old model until the new one is ready. Callers
+    take one snapshot (registry.current) per inference.
+    """
+
+    def __init__(self):
+        self._current = ModelBundle()
+        self._previous = None
+        self._reload_lock = Lock()
+        self._reloading = False
+        self._watch_thread = None
+        self.last_error = None
+        self.reload_count = 0
 
-with open(PREPROC_PATH, "r") as f:
-    PREPROC = json.load(f)
+    @property
+    def current(self) -> ModelBundle:
+        return self._current
+
+    def bundle(self, version):
+        """The live or just-replaced bundle with this version, else None."""
+        for bundle in (self._current, self._previous):
+            if bundle is not None and bundle.version == version:
+                return bundle
+        return None
+
+    def reload(self, model_path=None, classes_path=None, preproc_path=None, wait=False):
+        """
+        Load + validate a new bundle in the background, then swap it in.
+        Returns False if a reload is already in progress.
+        """
+        with self._reload_lock:
+            if self._reloading:
+                return False
+            self._reloading = True
+        cur = self._current
+        paths = (
+            model_path or cur.model_path,
+            classes_path or cur.classes_path,
+            preproc_path or cur.preproc_path,
+        )
+        t = Thread(target=self._load_and_swap, args=paths, name="model-reload", daemon=True)
+        t.start()
+        if wait:
+            t.join()
+        return True
+
+    def _load_and_swap(self, model_path, classes_path, preproc_path):
+        try:
+            bundle = ModelBundle(model_path, classes_path, preproc_path)
+            bundle.warm_up()
+            self._previous = self._current  # results already in flight can still be labelled
+            self._current = bundle          # single reference assignment = atomic swap
+            self.reload_count += 1
+            self.last_error = None
+            print(f"[INFO] Model reloaded from {bundle.model_path}")
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"[ERROR] Model reload failed, keeping current model: {self.last_error}")
+        finally:
+            with self._reload_lock:
+                self._reloading = False
+
+    def status(self) -> dict:
+        return {
+            **self._current.describe(),
+            "reloading": self._reloading,
+            "reload_count": self.reload_count,
+            "last_error": self.last_error,
+        }
+
+    def start_watching(self, interval=WATCH_INTERVAL_S):
+        """Reload automatically when the live bundle's artifact files change on disk."""
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+
+        def watch():
+            bundle = self._current
+            seen = bundle.artifact_mtimes()
+            while True:
+                time.sleep(interval)
+                if self._current is not bundle:
+                    # Swapped (possibly to other paths by an admin reload): watch the new files
+                    bundle = self._current
+                    seen = bundle.artifact_mtimes()
+                    continue
+                now = bundle.artifact_mtimes()
+                if now != seen and None not in now:
+                    seen = now
+                    self.reload()
+
+        self._watch_thread = Thread(target=watch, name="model-watch", daemon=True)
+        self._watch_thread.start()
 
-IMG_SIZE = PREPROC.get("img_size", 224)
-MEAN = np.array(PREPROC.get("mean", [0.485, 0.456, 0.406]), dtype=np.float32)
-STD  = np.array(PREPROC.get("std",  [0.229, 0.224, 0.225]), dtype=np.float32)
 
 # ---------------------------
 # LOAD MODEL
 # ---------------------------
-session = ort.InferenceSession(str(MODEL_PATH), providers=["CPUExecutionProvider"])
+registry = ModelRegistry()
 
 # ---------------------------
 # IMAGE PREPROCESSING
 # ---------------------------
-def preprocess(img_bgr):
+def preprocess(img_bgr, model=None):
+    model = model or registry.current
     img = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-    img = cv2.resize(img, (IMG_SIZE, IMG_SIZE))
+    img = cv2.resize(img, (model.img_size, model.img_size))
     img = img.astype(np.float32) / 255.0
-    img = (img - MEAN) / STD
+    img = (img - model.mean) / model.std
     img = np.transpose(img, (2, 0, 1))    # HWC -> CHW
     img = np.expand_dims(img, axis=0)
     return img
 
+def _view(img_bgr, name, size, pad_bgr):
+    """One square view of a frame (see TTA_VIEWS), BGR at size x size."""
+    h, w = img_bgr.shape[:2]
+    if name == "full":
+        return img_bgr
+    if name == "letterbox":
+        scale = size / float(max(h, w))
+        nw, nh = max(1, round(w * scale)), max(1, round(h * scale))
+        canvas = np.empty((size, size, 3), dtype=img_bgr.dtype)
+        canvas[:] = pad_bgr
+        x0, y0 = (size - nw) // 2, (size - nh) // 2
+        canvas[y0:y0 + nh, x0:x0 + nw] = cv2.resize(img_bgr, (nw, nh), interpolation=cv2.INTER_AREA)
+        return canvas
+    side = min(h, w)
+    offset = {"left": 0, "center": (max(h, w) - side) // 2, "right": max(h, w) - side}[name]
+    if w >= h:
+        return img_bgr[:, offset:offset + side]
+    return img_bgr[offset:offset + side, :]
+
+def preprocess_views(img_bgr, model=None, views=SINGLE_VIEW):
+    """[len(views), 3, H, W] tensor, one preprocessed row per view."""
+    model = model or registry.current
+    pad = (model.mean[::-1] * 255.0).clip(0, 255)      # RGB mean -> BGR pad colour
+    return np.concatenate(
+        [preprocess(_view(img_bgr, name, model.img_size, pad), model) for name in views], axis=0
+    )
+
 def _softmax(logits):
     logits = logits.astype(np.float64)
     m = logits.max(axis=1, keepdims=True)
@@ -54,96 +261,400 @@ def _softmax(logits):
 # ---------------------------
 # RUN INFERENCE
 # ---------------------------
+def _empty_result():
+    return {
+        "present": False,
+        "confidence": 0.0,
+        "crop_type": "",
+        "condition": "",
+        "color": "",
+        "sorted_to": "",
+        "size": "",
+        "probs": [],
+        "time_detected": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+def class_fields(pred_i, model=None):
+    """Map a class index to the crop_type/condition/color/sorted_to/size fields."""
+    model = model or registry.current
+    pred_class = model.class_names[pred_i].lower()
+
+    # parse class -> fields
+
+    # ex: "tomato_not_damaged_red" / "bellpepper_damaged_green"
+    parts = pred_class.split("_")
+    base  = parts[0] if parts else ""
+
+    # Crop type
+    if "pepper" in base or "bellpep" in base:
+        crop = "Bell Pepper"
+    elif "tomato" in base:
+        crop = "Tomato"
+    else:
+        crop = ""
+
+    # Condition
+    if "damaged" in pred_class:
+        condition = "Damaged"
+    elif "not" in pred_class and "damaged" in pred_class:
+        condition = "Not Damaged"
+    else:
+        condition = "Unknown"
+
+    # Color
+    if "red" in pred_class:
+        color = "Red"
+    elif "green" in pred_class:
+        color = "Green"
+    else:
+        color = "Unknown"
+
+    # Sorting bin logic
+    if condition == "Damaged":
+        sorted_to = "Center Bin"
+    elif color == "Green":
+        sorted_to = "Left Bin" if crop == "Tomato" else "Right Bin"
+    elif color == "Red":
+        sorted_to = "Right Bin" if crop == "Tomato" else "Left Bin"
+    else:
+        sorted_to = "Unknown"
+
+    # Size logic (example: you can use more advanced logic here)
+    if crop == "Tomato":
+        size = "Large" if color == "Red" else "Medium"
+    elif crop == "Bell Pepper":
+        size = "Small" if color == "Green" else "Medium"
+    else:
+        size = "Unknown"
+
+    return {
+        "crop_type": crop,
+        "condition": condition,
+        "color": color,
+        "sorted_to": sorted_to,
+        "size": "Medium",
+    }
+
+def _result_from_probs(probs_row, model):
+    """Turn one softmax row [C] into the dict the camera loop understands."""
+    pred_i = int(np.argmax(probs_row))
+    conf   = float(probs_row[pred_i])
+    fields = class_fields(pred_i, model)
+
+    # confidence threshold for presence
+    present = conf >= 0.20  # further lowered threshold for easier detection
+
+    # Debug logging for detection output
+    print(f"[DEBUG] Detection result: crop={fields['crop_type']}, color={fields['color']}, condition={fields['condition']}, conf={conf}, present={present}")
+
+    return {
+        "present": present,
+        "confidence": conf,
+        **fields,
+        "probs": [float(p) for p in probs_row],   # full softmax vector, class_names order
+        "model_version": model.version,
+        "time_detected": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+def _run_logits(batch, model):
+    """
+    Run the session on an [N, 3, H, W] batch. Models exported with a fixed
+    batch dimension of 1 are driven one row at a time.
+    """
+    session = model.session
+    input_meta = model.input_meta
+    if input_meta.shape and input_meta.shape[0] == 1 and batch.shape[0] > 1:
+        return np.concatenate(
+            [session.run(None, {input_meta.name: batch[i:i + 1]})[0] for i in range(batch.shape[0])],
+            axis=0
+        )
+    return session.run(None, {input_meta.name: batch})[0]
+
 def predict(img_bgr):
     """
     Return a dict the camera loop understands:
       crop_type, condition, color, sorted_to, size,
-      time_detected, confidence, present
+      time_detected, confidence, present,
+      probs (full softmax vector in class_names order)
     """
     try:
+        model = registry.current                         # one snapshot per inference
+
         # preprocess
-        input_tensor = preprocess(img_bgr)
+        input_tensor = preprocess(img_bgr, model)
 
         # inference
-        inputs = {session.get_inputs()[0].name: input_tensor}
-        logits = session.run(None, inputs)[0]            # shape [1, C]
+        logits = _run_logits(input_tensor, model)        # shape [1, C]
         probs  = _softmax(logits)                        # [1, C]
-        pred_i = int(np.argmax(probs, axis=1)[0])
-        conf   = float(probs[0, pred_i])
-        pred_class = CLASS_NAMES[pred_i].lower()
-
-        # parse class -> fields
-
-        # ex: "tomato_not_damaged_red" / "bellpepper_damaged_green"
-        parts = pred_class.split("_")
-        base  = parts[0] if parts else ""
-
-        # Crop type
-        if "pepper" in base or "bellpep" in base:
-            crop = "Bell Pepper"
-        elif "tomato" in base:
-            crop = "Tomato"
-        else:
-            crop = ""
-
-        # Condition
-        if "damaged" in pred_class:
-            condition = "Damaged"
-        elif "not" in pred_class and "damaged" in pred_class:
-            condition = "Not Damaged"
-        else:
-            condition = "Unknown"
-
-        # Color
-        if "red" in pred_class:
-            color = "Red"
-        elif "green" in pred_class:
-            color = "Green"
-        else:
-            color = "Unknown"
-
-        # Sorting bin logic
-        if condition == "Damaged":
-            sorted_to = "Center Bin"
-        elif color == "Green":
-            sorted_to = "Left Bin" if crop == "Tomato" else "Right Bin"
-        elif color == "Red":
-            sorted_to = "Right Bin" if crop == "Tomato" else "Left Bin"
-        else:
-            sorted_to = "Unknown"
-
-        # Size logic (example: you can use more advanced logic here)
-        if crop == "Tomato":
-            size = "Large" if color == "Red" else "Medium"
-        elif crop == "Bell Pepper":
-            size = "Small" if color == "Green" else "Medium"
-        else:
-            size = "Unknown"
-
-        # confidence threshold for presence
-        present = conf >= 0.20  # further lowered threshold for easier detection
-
-        # Debug logging for detection output
-        print(f"[DEBUG] Detection result: crop={crop}, color={color}, condition={condition}, conf={conf}, present={present}")
+        return _result_from_probs(probs[0], model)
+    except Exception as e:
+        _predict_failed(e)
+        return _empty_result()
 
-        return {
-            "present": present,
-            "confidence": conf,
-            "crop_type": crop,
-            "condition": condition,
-            "color": color,
-            "sorted_to": sorted_to,
-            "size": "Medium",
-            "time_detected": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+def predict_batch(images_bgr, single_view=False):
+    """
+    Batched variant of predict(): one session.run for all frames, one result
+    dict per input (same keys as predict). Used by the camera scheduler to
+    classify several lanes at once. With TTA_ENABLED each frame is classified
+    from TTA_VIEWS unless single_view is set (caller is behind) or the
+    latency budget recently tripped.
+    """
+    if not images_bgr:
+        return []
+    try:
+        model = registry.current                         # one snapshot per batch
+        views = SINGLE_VIEW if single_view else _tta.views()
+        t0 = time.perf_counter()
+        probs = predict_probs(images_bgr, model, views)  # [N, C]
+        if len(views) > 1:
+            _tta.observe((time.perf_counter() - t0) * 1000.0)
+        return [_result_from_probs(row, model) for row in probs]
     except Exception as e:
+        _predict_failed(e)
+        return [_empty_result() for _ in images_bgr]
+
+def _predict_failed(exc):
+    message = f"{type(exc).__name__}: {exc}"
+    if message != predict_health["last_error"]:
+        print(f"[ERROR] Inference failed: {message}")
+    predict_health["errors"] += 1
+    predict_health["last_error"] = message
+    predict_health["last_error_at"] = time.time()
+
+def predict_probs(images_bgr, model=None, views=SINGLE_VIEW):
+    """
+    Softmax probabilities [N, C] for a list of BGR frames (no gating, no
+    parsing). With several views, all N * V views go through one run and
+    each frame gets the mean of its views' probabilities.
+    """
+    model = model or registry.current
+    if tuple(views) == SINGLE_VIEW:
+        batch = np.concatenate([preprocess(img, model) for img in images_bgr], axis=0)
+        return _softmax(_run_logits(batch, model))       # [N, C]
+    batch = np.concatenate([preprocess_views(img, model, views) for img in images_bgr], axis=0)
+    probs = _softmax(_run_logits(batch, model))          # [N * V, C]
+    return probs.reshape(len(images_bgr), len(views), -1).mean(axis=1)
+
+class _TTABudget:
+    """Falls back to SINGLE_VIEW for TTA_RETRY_S whenever a multi-view run exceeds the budget."""
+
+    def __init__(self):
+        self.last_ms = None
+        self.fallbacks = 0
+        self._fallback_until = 0.0
+
+    def views(self):
+        if not TTA_ENABLED or time.time() < self._fallback_until:
+            return SINGLE_VIEW
+        return TTA_VIEWS
+
+    def observe(self, elapsed_ms):
+        self.last_ms = elapsed_ms
+        if elapsed_ms > TTA_LATENCY_BUDGET_MS:
+            self._fallback_until = time.time() + TTA_RETRY_S
+            self.fallbacks += 1
+            print(f"[WARN] Multi-view inference took {elapsed_ms:.0f} ms "
+                  f"(budget {TTA_LATENCY_BUDGET_MS:.0f} ms); single view for {TTA_RETRY_S:.0f}s")
+
+    def status(self) -> dict:
         return {
-            "present": False,
-            "confidence": 0.0,
-            "crop_type": "",
-            "condition": "",
-            "color": "",
-            "sorted_to": "",
-            "size": "",
-            "time_detected": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            "enabled": TTA_ENABLED,
+            "views": list(self.views()),
+            "last_ms": self.last_ms,
+            "fallbacks": self.fallbacks,
         }
+
+_tta = _TTABudget()
+
+def tta_status() -> dict:
+    return _tta.status()
+
+# ---------------------------
+# OFFLINE BULK CLASSIFICATION (CLI)
+# ---------------------------
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+VIDEO_EXTS = {".mp4", ".avi", ".mov", ".mkv", ".h264", ".mjpeg"}
+
+def _iter_media_files(paths):
+    for p in paths:
+        p = Path(p)
+        if p.is_dir():
+            for child in sorted(p.rglob("*")):
+                if child.suffix.lower() in IMAGE_EXTS | VIDEO_EXTS:
+                    yield child
+        elif p.suffix.lower() in IMAGE_EXTS | VIDEO_EXTS:
+            yield p
+
+def _label_for(path, class_names):
+    """Parent folder name when it names a class (case-insensitive), else None."""
+    folder = path.parent.name.lower()
+    for i, name in enumerate(class_names):
+        if name.lower() == folder:
+            return i
+    return None
+
+def _load_image(path):
+    return path, cv2.imread(str(path), cv2.IMREAD_COLOR)
+
+def _iter_frames(files, workers, video_stride, class_names):
+    """
+    Yield (path, frame_index, label, img_bgr). Images are decoded on a thread
+    pool with a bounded number in flight; video frames are read sequentially.
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def drain(limit):
+            while len(pending) > limit:
+                path, img = pending.popleft().result()
+                if img is None:
+                    print(f"[WARN] Could not decode {path}")
+                    continue
+                yield path, 0, _label_for(path, class_names), img
+
+        for path in files:
+            if path.suffix.lower() in VIDEO_EXTS:
+                yield from drain(0)
+                cap = cv2.VideoCapture(str(path))
+                label = _label_for(path, class_names)
+                idx = 0
+                try:
+                    while True:
+                        ok, frame = cap.read()
+                        if not ok:
+                            break
+                        if idx % video_stride == 0:
+                            yield path, idx, label, frame
+                        idx += 1
+                finally:
+                    cap.release()
+                continue
+            pending.append(pool.submit(_load_image, path))
+            yield from drain(workers * 2)
+        yield from drain(0)
+
+def _open_writer(out_path):
+    """Return (write_rows, close) for a .csv or .sqlite/.db output file."""
+    out_path = Path(out_path)
+    columns = ["source", "frame", "label", "predicted", "confidence",
+               "crop_type", "condition", "color", "sorted_to"]
+    if out_path.suffix.lower() in (".sqlite", ".sqlite3", ".db"):
+        import sqlite3
+        conn = sqlite3.connect(str(out_path))
+        conn.execute(f"CREATE TABLE IF NOT EXISTS predictions ({', '.join(columns)})")
+
+        def write_rows(rows):
+            conn.executemany(
+                f"INSERT INTO predictions VALUES ({', '.join('?' * len(columns))})",
+                [[r[c] for c in columns] for r in rows]
+            )
+            conn.commit()
+        return write_rows, conn.close
+
+    import csv
+    fh = open(out_path, "w", newline="")
+    writer = csv.DictWriter(fh, fieldnames=columns)
+    writer.writeheader()
+
+    def write_rows(rows):
+        writer.writerows(rows)
+    return write_rows, fh.close
+
+def classify_paths(paths, out_path, batch_size=16, workers=4, video_stride=1, views=SINGLE_VIEW):
+    """
+    Stream images / video frames from disk through preprocess + session in
+    batches and write one prediction row per item. Returns the confusion
+    matrix (rows = folder label, cols = prediction) when labels were found.
+    """
+    model = registry.current
+    class_names = model.class_names
+    write_rows, close = _open_writer(out_path)
+    confusion = np.zeros((len(class_names), len(class_names)), dtype=np.int64)
+    labelled = 0
+    total = 0
+
+    def flush(items):
+        nonlocal labelled, total
+        probs = predict_probs([img for _, _, _, img in items], model, views)
+        rows = []
+        for (path, frame_idx, label, _), row in zip(items, probs):
+            pred_i = int(np.argmax(row))
+            fields = class_fields(pred_i, model)
+            rows.append({
+                "source": str(path),
+                "frame": frame_idx,
+                "label": class_names[label] if label is not None else "",
+                "predicted": class_names[pred_i],
+                "confidence": round(float(row[pred_i]), 6),
+                "crop_type": fields["crop_type"],
+                "condition": fields["condition"],
+                "color": fields["color"],
+                "sorted_to": fields["sorted_to"],
+            })
+            if label is not None:
+                confusion[label, pred_i] += 1
+                labelled += 1
+        write_rows(rows)
+        total += len(items)
+
+    try:
+        batch = []
+        for item in _iter_frames(_iter_media_files(paths), workers, video_stride, class_names):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    finally:
+        close()
+
+    print(f"[INFO] Classified {total} item(s) -> {out_path}")
+    return confusion if labelled else None
+
+def _write_confusion(confusion, path, class_names):
+    import csv
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["label/predicted"] + class_names)
+        for name, row in zip(class_names, confusion):
+            writer.writerow([name] + [int(v) for v in row])
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Offline bulk classification of image folders and video files."
+    )
+    parser.add_argument("paths", nargs="+", help="image/video files or folders (folder names may be class labels)")
+    parser.add_argument("--out", default="predictions.csv", help="output .csv or .sqlite file")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4, help="image decode threads")
+    parser.add_argument("--video-stride", type=int, default=1, help="classify every Nth video frame")
+    parser.add_argument("--tta", action="store_true", help=f"average {', '.join(TTA_VIEWS)} views per item")
+    args = parser.parse_args(argv)
+
+    confusion = classify_paths(
+        args.paths, args.out,
+        batch_size=max(1, args.batch_size),
+        workers=max(1, args.workers),
+        video_stride=max(1, args.video_stride),
+        views=TTA_VIEWS if args.tta else SINGLE_VIEW,
+    )
+    if confusion is not None:
+        cm_path = Path(args.out).with_suffix(".confusion.csv")
+        class_names = registry.current.class_names
+        _write_confusion(confusion, cm_path, class_names)
+        correct = int(np.trace(confusion))
+        count = int(confusion.sum())
+        print(f"[INFO] Accuracy on labelled items: {correct}/{count} = {correct / count:.4f}")
+        print(f"[INFO] Confusion matrix -> {cm_path}")
+        width = max(len(n) for n in class_names)
+        print(" " * width + "  " + "  ".join(f"{n[:width]:>{width}}" for n in class_names))
+        for name, row in zip(class_names, confusion):
+            print(f"{name:>{width}}  " + "  ".join(f"{int(v):>{width}}" for v in row))
+
+if __name__ == "__main__":
+    main()
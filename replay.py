@@ -0,0 +1,283 @@
+# replay.py
+#
+# Feed a recorded session (camera.SessionRecorder segments) back through a
+# lane's gating and the /start_sorting -> save_detection DB path, as fast as
+# frames decode, and diff the decisions between code versions.
+#
+#   python replay.py run recordings/0 --out replay_new.json          (recorded predict() outputs)
+#   python replay.py run recordings/0 --model --out replay_new.json  (re-run today's model)
+#   python replay.py live recordings/0 --out live.json               (what the field unit decided)
+#   python replay.py diff replay_old.json replay_new.json            (exit 1 on differences)
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from pathlib import Path
+
+LABEL_KEYS  = ("crop_type", "condition", "color", "sorted_to", "size")
+SHOW_DIFFS  = 20   # diff: changed decisions printed before summarising
+
+
+# --------------------------------------------------
+# Decisions
+# --------------------------------------------------
+def _decision(meta):
+    """One gate decision in the shape both `live` and `run` write."""
+    result = meta.get("result") or {}
+    present = bool(result.get("present"))
+    return {
+        "n": meta["n"],
+        "t": meta["t"],
+        "skipped": bool(meta.get("skipped", False)),
+        "present": present,
+        "label": [result.get(k) for k in LABEL_KEYS] if present else None,
+        "confidence": round(float(result.get("confidence", 0.0)), 4),
+    }
+
+
+class _MemoryRecorder:
+    """Stands in for SessionRecorder on the replay lane and keeps its decisions."""
+
+    def __init__(self):
+        self.decisions = []
+
+    def frame(self, n, t, frame):
+        pass
+
+    def event(self, kind, n, t, **fields):
+        if kind == "decision":
+            self.decisions.append(_decision({"n": n, "t": t, **fields}))
+
+
+def live(args):
+    import camera
+
+    decisions = [_decision(meta) for meta, _ in camera.read_recording(args.source, frames=False)
+                 if meta["type"] == "decision"]
+    _write(args.out, {"mode": "live", "source": args.source, "decisions": decisions, "saves": None})
+
+
+# --------------------------------------------------
+# Replay
+# --------------------------------------------------
+def replay(source, use_model=False, recorded_config=False):
+    """Returns (report dict, stats dict)."""
+    import cv2
+    import numpy as np
+    import camera
+    import app_signup
+    import snapshot_archive
+    from duotectdb_init import create_tables, add_missing_columns
+    from model_inference import registry, predict_batch
+
+    # Predictions are written after their frame, so collect them up front.
+    preds, lane_name, duration = {}, camera.DEFAULT_LANE, [None, None]
+    for meta, _ in camera.read_recording(source, frames=False):
+        if meta["type"] == "predict":
+            preds[meta["n"]] = meta["pred"]
+        elif meta["type"] == "config":
+            lane_name = meta.get("lane", lane_name)
+        duration[0] = meta["t"] if duration[0] is None else duration[0]
+        duration[1] = meta["t"]
+
+    tmpdir = tempfile.mkdtemp(prefix="duotectiq-replay-")
+    db_path = os.path.join(tmpdir, "replay.sqlite3")
+    create_tables(db_path)
+    add_missing_columns(db_path)
+    app_signup.DB_PATH = db_path
+    # Replayed acceptances must not land in the live snapshot archive, where
+    # /snapshot/<lane>/<seq> would serve them in place of the real frames
+    snapshot_archive.ARCHIVE_ENABLED = False
+    snapshot_archive.archive.root = Path(tmpdir) / "snapshots"
+    snapshot_archive.archive.db_path = db_path
+
+    lane = camera.CameraLane(lane_name)
+    lane.recorder = _MemoryRecorder()
+    missing = [0]
+
+    def recorded_predict(frame):
+        # Already-resolved future: the lane gates it on the same frame
+        done = Future()
+        pred = preds.get(lane.frames_captured)
+        if pred is None:
+            # This version infers on a frame the recorded run did not
+            missing[0] += 1
+            done.set_result({"present": False, "confidence": 0.0, "probs": []})
+        else:
+            # Recorded probs are labelled with the loaded model's classes (the
+            # loop below warns if the recording used other class_names)
+            done.set_result(dict(pred, model_version=registry.current.version))
+        return done
+
+    def model_predict(frame):
+        # Classify inline (not via the shared scheduler) so results stay on their frame
+        done = Future()
+        done.set_result(predict_batch([frame])[0])
+        return done
+
+    lane._predict = model_predict if use_model else recorded_predict
+
+    saves, waiting, arms = [], None, 0
+    frames = 0
+    t0 = time.perf_counter()
+    try:
+        for meta, blob in camera.read_recording(source):
+            kind, now = meta["type"], meta["t"]
+            if kind == "config":
+                if meta.get("class_names") and meta["class_names"] != list(registry.current.class_names):
+                    print("[WARN] Recording was made with different class names than the loaded model")
+                if recorded_config:
+                    gate = {k: v for k, v in (meta.get("gate") or {}).items() if k in camera.GateConfig.KEYS}
+                    camera.gate_config.update(gate)
+            elif kind == "arm":
+                # Same contract as /start_sorting: wait for a seq past the token and last save
+                token = lane.mark_sorting_start(now=now)
+                after = max(token, app_signup.last_saved_seq(lane.name) or 0)
+                arms += 1
+                waiting = (arms, after, now + app_signup.START_SORTING_TIMEOUT_S)
+            elif kind == "frame":
+                frame = cv2.imdecode(np.frombuffer(blob, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if frame is None:
+                    continue
+                lane.frames_captured = meta["n"] - 1   # keep live numbering across dropped frames
+                lane._process_frame(frame, now=now)
+                frames += 1
+
+                if waiting is not None:
+                    arm, after, deadline = waiting
+                    detected = lane.detect_crop()
+                    if detected and detected["seq"] > after:
+                        app_signup.save_detection(detected, lane.name)
+                        saves.append({"arm": arm, "n": meta["n"], "label": [detected.get(k) for k in LABEL_KEYS]})
+                        waiting = None
+                    elif now > deadline:
+                        saves.append({"arm": arm, "n": meta["n"], "label": None})  # "No crop detected"
+                        waiting = None
+        elapsed = time.perf_counter() - t0
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute(
+            'SELECT seq, lane, crop_type, condition, color, sorted_to, size FROM tbl_sorting ORDER BY id'
+        ).fetchall()
+        conn.close()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    span = (duration[1] - duration[0]) if duration[0] is not None else 0.0
+    stats = {
+        "frames": frames,
+        "seconds": elapsed,
+        "recorded_seconds": span,
+        "speedup": span / elapsed if elapsed else 0.0,
+        "missing_predictions": missing[0],
+    }
+    report = {
+        "mode": "model" if use_model else "recorded",
+        "source": str(source),
+        "decisions": lane.recorder.decisions,
+        "saves": saves,
+        "db_rows": [list(r) for r in rows],
+        "stats": stats,
+    }
+    return report, stats
+
+
+def run(args):
+    report, stats = replay(args.source, use_model=args.model, recorded_config=args.recorded_config)
+    print(f"Replayed {stats['frames']} frames ({stats['recorded_seconds']:.1f}s recorded) "
+          f"in {stats['seconds']:.1f}s, {stats['speedup']:.1f}x real time")
+    print(f"Accepted: {sum(d['present'] for d in report['decisions'])}, "
+          f"saved rows: {len(report['db_rows'])}, arms: {len(report['saves'])}")
+    if stats["missing_predictions"]:
+        print(f"[WARN] {stats['missing_predictions']} frame(s) had no recorded prediction; "
+              f"rerun with --model to classify them")
+    _write(args.out, report)
+
+
+def _write(path, report):
+    report["created"] = datetime.now().isoformat(timespec="seconds")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Written to {path}")
+
+
+# --------------------------------------------------
+# Diff
+# --------------------------------------------------
+def diff(args):
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    def keyed(report):
+        return {d["n"]: (d["skipped"], d["present"], tuple(d["label"] or ())) for d in report["decisions"]}
+
+    a, b = keyed(old), keyed(new)
+    changed = [n for n in sorted(set(a) & set(b)) if a[n] != b[n]]
+    only_old, only_new = sorted(set(a) - set(b)), sorted(set(b) - set(a))
+    differences = len(changed) + len(only_old) + len(only_new)
+
+    for n in changed[:SHOW_DIFFS]:
+        print(f"frame {n}: {_fmt(a[n])}  ->  {_fmt(b[n])}")
+    if len(changed) > SHOW_DIFFS:
+        print(f"... {len(changed) - SHOW_DIFFS} more changed decision(s)")
+    print(f"decisions: {len(changed)} changed, {len(only_old)} only in old, {len(only_new)} only in new")
+    print(f"accepted: {sum(v[1] for v in a.values())} -> {sum(v[1] for v in b.values())}")
+
+    if old.get("saves") is not None and new.get("saves") is not None:
+        save_changes = [(s, t) for s, t in zip(old["saves"], new["saves"]) if s != t]
+        save_changes += [(s, None) for s in old["saves"][len(new["saves"]):]]
+        save_changes += [(None, t) for t in new["saves"][len(old["saves"]):]]
+        for s, t in save_changes[:SHOW_DIFFS]:
+            print(f"start_sorting: {s}  ->  {t}")
+        print(f"start_sorting outcomes: {len(save_changes)} changed; "
+              f"db rows {len(old.get('db_rows', []))} -> {len(new.get('db_rows', []))}")
+        differences += len(save_changes)
+        differences += old.get("db_rows") != new.get("db_rows")
+
+    if differences:
+        raise SystemExit(1)
+    print("\nNo differences.")
+
+
+def _fmt(decision):
+    skipped, present, label = decision
+    if skipped:
+        return "skipped"
+    return "/".join(str(x) for x in label) if present else "no crop"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded camera sessions through gating and the DB.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="replay a recording with this code version")
+    p_run.add_argument("source", help="a .rec segment or a lane's recording directory")
+    p_run.add_argument("--out", default="replay_output.json")
+    p_run.add_argument("--model", action="store_true", help="classify frames with the loaded model")
+    p_run.add_argument("--recorded-config", action="store_true",
+                       help="use the gate thresholds stored in the recording instead of this version's")
+    p_run.set_defaults(func=run)
+
+    p_live = sub.add_parser("live", help="extract the decisions made while recording")
+    p_live.add_argument("source")
+    p_live.add_argument("--out", default="replay_live.json")
+    p_live.set_defaults(func=live)
+
+    p_diff = sub.add_parser("diff", help="compare two run/live outputs")
+    p_diff.add_argument("old")
+    p_diff.add_argument("new")
+    p_diff.set_defaults(func=diff)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
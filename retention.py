@@ -0,0 +1,371 @@
+# retention.py
+#
+# Keeps duotectdb.sqlite3 small on SD-card storage: detail rows older than
+# DETAIL_RETENTION_DAYS are rolled up into hourly/daily count tables,
+# optionally archived to compressed files, then deleted. ANALYZE / VACUUM run
+# on a schedule from a background thread, never on the request path.
+#
+#   python retention.py compact            (one compaction pass now)
+#   python retention.py maintain --vacuum  (compaction + ANALYZE + VACUUM)
+import argparse
+import csv
+import gzip
+import io
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from threading import Thread
+
+from duotectdb_init import DETECTION_TABLE
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+DB_PATH                = "duotectdb.sqlite3"
+RETAINED_TABLES        = ("tbl_sorting", "tbl_actlog")
+UTC_TABLES             = ("tbl_actlog",)  # time_detected is SQLite CURRENT_TIMESTAMP (UTC), not local time
+DIMENSIONS             = ("lane", "crop_type", "condition", "color", "sorted_to", "size")
+DETAIL_RETENTION_DAYS  = 14      # keep raw rows this long
+HOURLY_RETENTION_DAYS  = 90      # then only daily aggregates remain
+ARCHIVE_RAW_ROWS       = True    # write compacted raw rows to ARCHIVE_DIR before deleting
+ARCHIVE_DIR            = Path(__file__).resolve().parent / "archive"
+ARCHIVE_FORMAT         = "csv.gz"  # or "parquet" (needs pyarrow; falls back to csv.gz)
+MAINTENANCE_INTERVAL_S = 6 * 3600  # compaction + ANALYZE
+VACUUM_INTERVAL_S      = 7 * 86400
+
+
+# ---------------------------
+# Schema
+# ---------------------------
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _dims(conn, table):
+    cols = set(_columns(conn, table))
+    return [d for d in DIMENSIONS if d in cols]
+
+
+def _is_view(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='view' AND name=?", (table,)).fetchone() is not None
+
+
+def _time_filter(conn, table):
+    """
+    (where-clause, base table) for "older than a '%Y-%m-%d %H:%M:%S' bound".
+    tbl_sorting is a view over tbl_detection: compare on its indexed epoch ts
+    and delete from the base table.
+    """
+    if _is_view(conn, table):
+        return "ts < CAST(strftime('%s', ?, 'utc') AS INTEGER)", DETECTION_TABLE
+    return "time_detected < ?", table
+
+
+def create_aggregate_tables(conn):
+    """<table>_hourly / <table>_daily: one count per bucket and dimension combination."""
+    for table in RETAINED_TABLES:
+        if not _columns(conn, table):
+            continue
+        dims = _dims(conn, table)
+        for level in ("hourly", "daily"):
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table}_{level} (
+                    bucket TEXT NOT NULL,
+                    {", ".join(f"{d} TEXT NOT NULL DEFAULT ''" for d in dims)},
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, {", ".join(dims)})
+                )
+            ''')
+        if not _is_view(conn, table):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_time ON {table} (time_detected)')
+    conn.commit()
+
+
+# ---------------------------
+# Compaction
+# ---------------------------
+_BUCKETS = {
+    "hourly": "%Y-%m-%d %H:00:00",
+    "daily":  "%Y-%m-%d",
+}
+
+
+ARCHIVE_CHUNK = 1000  # rows read per query while archiving
+
+
+def _cutoff(table, days, fmt):
+    """now - days as text in the clock the table's time_detected uses."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None) if table in UTC_TABLES else datetime.now()
+    return (now - timedelta(days=days)).strftime(fmt)
+
+
+def _rollup(conn, table, level, dims, where, params):
+    """Add counts of detail rows matching where into <table>_<level> (upsert)."""
+    dim_sel = ", ".join(f"COALESCE({d}, '')" for d in dims)
+    dim_cols = ", ".join(dims)
+    conn.execute(f'''
+        INSERT INTO {table}_{level} (bucket, {dim_cols}, count)
+        SELECT strftime('{_BUCKETS[level]}', time_detected) AS b, {dim_sel}, COUNT(*)
+        FROM {table}
+        WHERE {where}
+        GROUP BY b, {dim_sel}
+        ON CONFLICT (bucket, {dim_cols}) DO UPDATE SET count = count + excluded.count
+    ''', params)
+
+
+def _old_rows(conn, table, older, cutoff):
+    """
+    (header, id column index, chunk iterator) over detail rows older than cutoff. Each
+    chunk is its own short query, so no lock is held between chunks and
+    writers are never blocked for the length of the archive write.
+    """
+    cur = conn.execute(f'SELECT * FROM {table} WHERE {older} AND id > ? ORDER BY id LIMIT ?',
+                       (cutoff, -1, ARCHIVE_CHUNK))
+    header = [d[0] for d in cur.description]
+    id_col = header.index("id")
+
+    def chunks(rows):
+        while rows:
+            yield rows
+            if len(rows) < ARCHIVE_CHUNK:
+                return
+            rows = conn.execute(f'SELECT * FROM {table} WHERE {older} AND id > ? ORDER BY id LIMIT ?',
+                                (cutoff, rows[-1][id_col], ARCHIVE_CHUNK)).fetchall()
+    return header, id_col, chunks(cur.fetchall())
+
+
+def _archive_rows(conn, table, older, cutoff, archive_dir, fmt):
+    """
+    Write detail rows older than cutoff to one compressed file, chunk by
+    chunk and outside any write lock. Returns (path, highest id written), or
+    (None, None) when there is nothing to archive.
+    """
+    header, id_col, chunks = _old_rows(conn, table, older, cutoff)
+    rows = next(chunks, None)
+    if not rows:
+        return None, None
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"{table}-before-{cutoff[:10]}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    last_id = None
+
+    if fmt == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("[WARN] pyarrow not installed, archiving as csv.gz instead")
+        else:
+            path = archive_dir / f"{stem}.parquet"
+            writer = None
+            try:
+                while rows:
+                    chunk = pa.table({h: [r[i] for r in rows] for i, h in enumerate(header)})
+                    if writer is None:
+                        # an all-NULL column in the first chunk must not fix its type to null
+                        schema = pa.schema([(f.name, pa.string() if pa.types.is_null(f.type) else f.type)
+                                            for f in chunk.schema])
+                        writer = pq.ParquetWriter(str(path), schema, compression="zstd")
+                    writer.write_table(chunk.cast(writer.schema))
+                    last_id = rows[-1][id_col]
+                    rows = next(chunks, None)
+            except Exception:
+                if writer is not None:
+                    writer.close()
+                path.unlink(missing_ok=True)
+                raise
+            writer.close()
+            return path, last_id
+
+    path = archive_dir / f"{stem}.csv.gz"
+    try:
+        with gzip.open(path, "wt", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(header)
+            while rows:
+                writer.writerows(rows)
+                last_id = rows[-1][id_col]
+                rows = next(chunks, None)
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    return path, last_id
+
+
+def compact(db_path=DB_PATH, detail_days=DETAIL_RETENTION_DAYS, hourly_days=HOURLY_RETENTION_DAYS,
+            archive=ARCHIVE_RAW_ROWS, archive_dir=ARCHIVE_DIR, archive_format=ARCHIVE_FORMAT):
+    """
+    One retention pass. Raw rows older than detail_days are archived (optional),
+    counted into <table>_hourly and <table>_daily, and deleted; hourly buckets
+    older than hourly_days are dropped (their counts already live in daily).
+    Returns {table: rows_compacted}.
+
+    The archive file is written first, outside the write lock; rollup and
+    delete then cover exactly the rows up to the last archived id, so
+    detections keep being saved while a large backlog is archived.
+    """
+    summary = {}
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        create_aggregate_tables(conn)
+        for table in RETAINED_TABLES:
+            if not _columns(conn, table):
+                continue
+            dims = _dims(conn, table)
+            older, base = _time_filter(conn, table)
+            detail_cutoff = _cutoff(table, detail_days, '%Y-%m-%d %H:%M:%S')
+            hourly_cutoff = _cutoff(table, hourly_days, '%Y-%m-%d %H:00:00')
+
+            path = last_id = None
+            if archive:
+                path, last_id = _archive_rows(conn, table, older, detail_cutoff, archive_dir, archive_format)
+
+            # Block writers only for rollup + delete
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if not archive:
+                    last_id = conn.execute(f'SELECT MAX(id) FROM {table} WHERE {older}',
+                                           (detail_cutoff,)).fetchone()[0]
+                if last_id is not None:
+                    where = f"{older} AND id <= ?"
+                    for level in _BUCKETS:
+                        _rollup(conn, table, level, dims, where, (detail_cutoff, last_id))
+                    cur = conn.execute(f'DELETE FROM {base} WHERE {where}', (detail_cutoff, last_id))
+                    summary[table] = cur.rowcount
+                else:
+                    summary[table] = 0
+                conn.execute(f'DELETE FROM {table}_hourly WHERE bucket < ?', (hourly_cutoff,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                if path is not None:
+                    path.unlink(missing_ok=True)  # rows are still here; the next pass archives them again
+                raise
+            if path is not None:
+                print(f"[INFO] Archived {table} rows older than {detail_cutoff} -> {path}")
+    finally:
+        conn.close()
+    return summary
+
+
+def analyze(db_path=DB_PATH, vacuum=False):
+    """Refresh planner stats; optionally VACUUM to return freed pages to the filesystem."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA optimize')
+        if vacuum:
+            conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+
+# ---------------------------
+# Background schedule
+# ---------------------------
+class RetentionScheduler:
+    """Runs compact() + ANALYZE every MAINTENANCE_INTERVAL_S and VACUUM every VACUUM_INTERVAL_S."""
+
+    def __init__(self, db_path=DB_PATH, interval=MAINTENANCE_INTERVAL_S, vacuum_interval=VACUUM_INTERVAL_S):
+        self.db_path = db_path
+        self.interval = interval
+        self.vacuum_interval = vacuum_interval
+        self._thread = None
+        self._last_vacuum = time.time()
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+
+    def run_once(self):
+        try:
+            self.last_result = compact(self.db_path)
+            do_vacuum = time.time() - self._last_vacuum >= self.vacuum_interval
+            analyze(self.db_path, vacuum=do_vacuum)
+            if do_vacuum:
+                self._last_vacuum = time.time()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"[ERROR] Retention pass failed: {self.last_error}")
+        self.last_run = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.interval)
+                self.run_once()
+
+        self._thread = Thread(target=loop, name="db-retention", daemon=True)
+        self._thread.start()
+
+
+# ---------------------------
+# Streaming export
+# ---------------------------
+EXPORT_LEVELS = ("detail", "hourly", "daily")
+
+
+def iter_export(db_path, level="detail", since=None, until=None, table="tbl_sorting", chunk=500):
+    """Yield CSV text chunks for detail rows or aggregates, without loading them all."""
+    if level not in EXPORT_LEVELS:
+        raise ValueError(f"level must be one of {', '.join(EXPORT_LEVELS)}")
+    source = table if level == "detail" else f"{table}_{level}"
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if level != "detail":
+            create_aggregate_tables(conn)
+            time_col, bound = "bucket", "?"
+        elif _is_view(conn, table):
+            time_col, bound = "ts", "CAST(strftime('%s', ?, 'utc') AS INTEGER)"
+        else:
+            time_col, bound = "time_detected", "?"
+
+        where, params = [], []
+        if since:
+            where.append(f"{time_col} >= {bound}")
+            params.append(since)
+        if until:
+            where.append(f"{time_col} < {bound}")
+            params.append(until)
+        sql = f"SELECT * FROM {source}" + (f" WHERE {' AND '.join(where)}" if where else "") + f" ORDER BY {time_col}"
+        cur = conn.execute(sql, params)
+        yield _csv_line([d[0] for d in cur.description])
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            yield "".join(_csv_line(r) for r in rows)
+    finally:
+        conn.close()
+
+
+def _csv_line(values):
+    buf = io.StringIO()
+    csv.writer(buf).writerow(values)
+    return buf.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact / maintain the DUOTECTIQ database.")
+    parser.add_argument("cmd", choices=("compact", "maintain"))
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--detail-days", type=int, default=DETAIL_RETENTION_DAYS)
+    parser.add_argument("--no-archive", action="store_true")
+    parser.add_argument("--vacuum", action="store_true")
+    args = parser.parse_args(argv)
+
+    result = compact(args.db, detail_days=args.detail_days, archive=not args.no_archive)
+    print(f"[INFO] Compacted rows: {result}")
+    if args.cmd == "maintain":
+        analyze(args.db, vacuum=args.vacuum)
+        print("[INFO] ANALYZE" + (" + VACUUM" if args.vacuum else "") + " done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# snapshot_archive.py
+import hashlib
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from queue import Queue, Full
+from threading import Thread, Lock
+
+# ---------------------------
+# CONFIG
+# ---------------------------
+ARCHIVE_ENABLED        = False      # opt-in: keep a frame for every accepted detection
+ARCHIVE_DIR            = Path(__file__).resolve().parent / "snapshots"
+ARCHIVE_DB_PATH        = "duotectdb.sqlite3"
+ARCHIVE_FORMAT         = "webp"     # "webp" or "jpg" (webp falls back to jpg if unsupported)
+ARCHIVE_QUALITY        = 80
+ARCHIVE_MAX_SIDE       = 640        # longest side after downscale
+ARCHIVE_MAX_BYTES      = 2 * 1024 ** 3
+ARCHIVE_RETENTION_DAYS = 30
+ARCHIVE_QUEUE_SIZE     = 32         # pending snapshots; extra ones are dropped, never waited on
+ARCHIVE_SWEEP_S        = 3600       # retention sweep period
+
+
+class SnapshotArchive:
+    """
+    Asynchronous, size-capped, content-addressed store for the frames behind
+    accepted detections. submit() only enqueues; a worker thread downscales,
+    encodes, writes <sha256>.<ext> under ARCHIVE_DIR and records it in
+    tbl_snapshots keyed by (lane, seq). Lanes resume seq numbering past
+    max_seq() on startup, so the key stays unique across restarts. Oldest
+    snapshots are evicted when the archive exceeds ARCHIVE_MAX_BYTES or
+    ARCHIVE_RETENTION_DAYS.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, db_path=ARCHIVE_DB_PATH,
+                 max_bytes=ARCHIVE_MAX_BYTES, retention_days=ARCHIVE_RETENTION_DAYS):
+        self.root = Path(root)
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self._queue = Queue(maxsize=ARCHIVE_QUEUE_SIZE)
+        self._thread = None
+        self._start_lock = Lock()
+        self._total_bytes = None
+        self._last_sweep = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.last_error = None
+
+    # -------------------------
+    # Capture-side API
+    # -------------------------
+    def submit(self, lane: str, seq: int, frame) -> bool:
+        """Queue a frame for archiving. Never blocks; returns False if it was dropped."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((str(lane), int(seq), frame, datetime.now()))
+            return True
+        except Full:
+            self.dropped += 1
+            return False
+
+    def stats(self) -> dict:
+        return {
+            "enabled": ARCHIVE_ENABLED,
+            "written": self.written,
+            "dropped": self.dropped,
+            "pending": self._queue.qsize(),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "last_error": self.last_error,
+        }
+
+    def max_seq(self, lane: str) -> int:
+        """Highest seq archived for a lane (0 if none)."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('SELECT MAX(seq) FROM tbl_snapshots WHERE lane=?', (str(lane),)).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        finally:
+            conn.close()
+        return (row[0] or 0) if row else 0
+
+    def path_for(self, lane: str, seq: int) -> Path | None:
+        """Snapshot file for a detection, if it is still archived."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(
+                'SELECT path FROM tbl_snapshots WHERE lane=? AND seq=? ORDER BY id DESC LIMIT 1',
+                (str(lane), int(seq))
+            ).fetchone()
+        except sqlite3.OperationalError:
+            row = None  # archive never ran, table not created yet
+        finally:
+            conn.close()
+        if not row:
+            return None
+        path = self.root / row[0]
+        return path if path.exists() else None
+
+    # -------------------------
+    # Worker
+    # -------------------------
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._worker, name="snapshot-archive", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        conn = sqlite3.connect(self.db_path)
+        _create_table(conn)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._total_bytes = _stored_bytes(conn)
+        while True:
+            lane, seq, frame, taken_at = self._queue.get()
+            try:
+                self._store(conn, lane, seq, frame, taken_at)
+                self.written += 1
+                if self._total_bytes > self.max_bytes or time.time() - self._last_sweep > ARCHIVE_SWEEP_S:
+                    self._evict(conn)
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"[ERROR] Snapshot archive: {self.last_error}")
+
+    def _store(self, conn, lane, seq, frame, taken_at):
+        data, ext = _encode(frame)
+        digest = hashlib.sha256(data).hexdigest()
+        rel = Path(digest[:2]) / f"{digest}.{ext}"
+        path = self.root / rel
+
+        already = conn.execute('SELECT 1 FROM tbl_snapshots WHERE sha256=? LIMIT 1', (digest,)).fetchone()
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            tmp.write_bytes(data)
+            tmp.replace(path)
+        if not already:
+            self._total_bytes += len(data)
+
+        conn.execute(
+            'INSERT INTO tbl_snapshots (lane, seq, sha256, path, bytes, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (lane, seq, digest, rel.as_posix(), len(data), taken_at.strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        conn.commit()
+
+    def _evict(self, conn):
+        """Drop snapshots past retention, then oldest-first until under the size cap."""
+        self._last_sweep = time.time()
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+        for (row_id,) in conn.execute('SELECT id FROM tbl_snapshots WHERE created_at < ?', (cutoff,)).fetchall():
+            self._delete_row(conn, row_id)
+
+        while self._total_bytes > self.max_bytes:
+            row = conn.execute('SELECT id FROM tbl_snapshots ORDER BY id ASC LIMIT 1').fetchone()
+            if not row:
+                break
+            self._delete_row(conn, row[0])
+        conn.commit()
+
+    def _delete_row(self, conn, row_id):
+        sha, rel, size = conn.execute(
+            'SELECT sha256, path, bytes FROM tbl_snapshots WHERE id=?', (row_id,)
+        ).fetchone()
+        conn.execute('DELETE FROM tbl_snapshots WHERE id=?', (row_id,))
+        # identical frames share one file; only remove it with its last reference
+        if not conn.execute('SELECT 1 FROM tbl_snapshots WHERE sha256=? LIMIT 1', (sha,)).fetchone():
+            try:
+                (self.root / rel).unlink()
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= size
+
+
+# -------------------------
+# Helpers
+# -------------------------
+def _create_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tbl_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lane TEXT,
+            seq INTEGER,
+            sha256 TEXT NOT NULL,
+            path TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_snapshots_lane_seq ON tbl_snapshots (lane, seq)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_snapshots_sha ON tbl_snapshots (sha256)')
+    conn.commit()
+
+
+def _stored_bytes(conn) -> int:
+    row = conn.execute(
+        'SELECT COALESCE(SUM(bytes), 0) FROM (SELECT sha256, MAX(bytes) AS bytes FROM tbl_snapshots GROUP BY sha256)'
+    ).fetchone()
+    return int(row[0])
+
+
+def _encode(frame):
+    """Downscale to ARCHIVE_MAX_SIDE and encode; returns (bytes, extension)."""
+    import cv2
+    h, w = frame.shape[:2]
+    scale = ARCHIVE_MAX_SIDE / float(max(h, w))
+    if scale < 1.0:
+        frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    if ARCHIVE_FORMAT == "webp":
+        ok, buf = cv2.imencode(".webp", frame, [int(cv2.IMWRITE_WEBP_QUALITY), ARCHIVE_QUALITY])
+        if ok:
+            return buf.tobytes(), "webp"
+    ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), ARCHIVE_QUALITY])
+    if not ok:
+        raise ValueError("could not encode snapshot")
+    return buf.tobytes(), "jpg"
+
+
+archive = SnapshotArchive()